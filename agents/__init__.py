@@ -0,0 +1,28 @@
+"""
+Workflow agents - each agent module is imported lazily on first attribute access
+"""
+
+import importlib
+
+_LAZY_AGENTS = {
+    "ComprehensiveQueryAgent": "agents.comprehensive_query_agent",
+    "QueryAnalysisAgent": "agents.query_analysis_agent",
+    "ResponseEnrichmentAgent": "agents.response_enrichment_agent",
+    "ToolExecutionAgent": "agents.tool_execution_agent",
+}
+
+__all__ = list(_LAZY_AGENTS)
+
+
+def __getattr__(name):
+    module_name = _LAZY_AGENTS.get(name)
+    if module_name is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+    agent = getattr(importlib.import_module(module_name), name)
+    globals()[name] = agent  # Cache so later lookups skip __getattr__
+    return agent
+
+
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
@@ -2,9 +2,18 @@
 Comprehensive Query Agent - Handles multi-step comprehensive queries
 Extracts IDs from search results and creates follow-up queries for complete information
 """
-import json
-from typing import Dict, Any, List
-from cust_logger import logger
+import logging
+import re
+from itertools import zip_longest
+from typing import Dict, Any, List, Tuple
+from state import ExtractedIds, QueryAnalysisView
+
+logger = logging.getLogger(__name__)
+
+
+def _keyword_pattern(keywords) -> str:
+    """Regex alternation for literal keywords, longest first so phrases win over their prefixes"""
+    return "|".join(re.escape(kw) for kw in sorted(keywords, key=len, reverse=True))
 
 
 class ComprehensiveQueryAgent:
@@ -14,8 +23,66 @@ class ComprehensiveQueryAgent:
     2. Create follow-up plan with comprehensive tools using the extracted ID
     """
     
+    # Comprehensive signals
+    COMPREHENSIVE_KEYWORDS = frozenset({
+        "everything", "all details", "all information", "complete", 
+        "comprehensive", "tell me about", "full details", "tell me everything",
+        "get details", "full status", "complete info"
+    })
+    
+    # 🔗 Cross-entity linking signals - queries that ask for relationships
+    CROSS_ENTITY_KEYWORDS = frozenset({
+        "and their", "and its", "with their", "with its",
+        "related", "linked", "associated", "affected",
+        "along with", "together with"
+    })
+    
+    # Intent signals - "get details", "tell me about" often want comprehensive data
+    DETAILED_INTENT_KEYWORDS = frozenset({"get details", "tell me about", "full", "complete", "all"})
+    
+    # Tools that already provide comprehensive entity details
+    COMPREHENSIVE_TOOLS = frozenset({
+        "get_resource_by_id", "get_resource_version", "get_resource_metadata",
+        "get_changelog_by_resource", "get_resource_tickets", "get_notifications_by_resource",
+        "get_incident_by_id", "get_incident_changelogs"
+    })
+    
+    # Follow-up fan-out budget: estimated (latency seconds, response tokens) per tool call.
+    # Linked-entity lookups are added while the estimated wall time (at FOLLOWUP_MAX_CONCURRENT)
+    # and the tokens handed to response generation stay within budget
+    TOOL_COST_ESTIMATES = {
+        "get_resource_by_id": (0.15, 400),
+        "get_resource_version": (0.15, 200),
+        "get_resource_metadata": (0.15, 300),
+        "get_resource_tickets": (0.25, 800),
+        "get_changelog_by_resource": (0.25, 800),
+        "get_notifications_by_resource": (0.25, 600),
+        "get_incident_by_id": (0.2, 500),
+        "get_incident_changelogs": (0.25, 800)
+    }
+    DEFAULT_TOOL_COST = (0.2, 500)
+    FOLLOWUP_MAX_CONCURRENT = 8
+    FOLLOWUP_BUDGET_SECONDS = 3.0
+    FOLLOWUP_BUDGET_TOKENS = 8000
+    
+    # Both query keyword sets compiled into a single alternation so the query is scanned
+    # once; the named group of each match tells us which category it belongs to.
+    # Cross-entity phrases are word-bounded so e.g. "unrelated" doesn't trigger a follow-up fan-out
+    _KEYWORD_RE = re.compile(
+        f"(?P<comprehensive>{_keyword_pattern(COMPREHENSIVE_KEYWORDS)})"
+        rf"|\b(?P<cross_entity>{_keyword_pattern(CROSS_ENTITY_KEYWORDS)})\b"
+    )
+    _DETAILED_INTENT_RE = re.compile(_keyword_pattern(DETAILED_INTENT_KEYWORDS))
+    
     def __init__(self, llm_client=None):
         self.llm_client = llm_client
+        
+        # tool_name → ID extractor; names outside the exact search tools are resolved once and memoized
+        self._extractors = {
+            "search_resources": self._extract_resource,
+            "search_incidents": self._extract_incident,
+            "search_tickets": self._extract_ticket
+        }
     
     async def analyze_and_expand(self, state: Dict[str, Any]) -> Dict[str, Any]:
         """
@@ -25,36 +92,24 @@ class ComprehensiveQueryAgent:
         3. Search results (if we found an ID, we can get complete details)
         """
         try:
-            user_query = state.get("user_query", "").lower()
-            context_data = state.get("context_data", {})
-            query_analysis = context_data.get("query_analysis", {})
-            llm_analysis = query_analysis.get("llm_analysis", {})
+            user_query = (state.get("user_query") or "").lower()
+            if not user_query:
+                return state
             
             # Check multiple signals for comprehensive intent
-            is_comprehensive = llm_analysis.get("comprehensive", False)
-            scope = llm_analysis.get("scope", "")
-            intent = llm_analysis.get("intent", "").lower()
-            is_multi_entity = llm_analysis.get("multi_entity", False)
+            analysis = QueryAnalysisView.from_state(state)
+            is_comprehensive = analysis.is_comprehensive
+            scope = analysis.scope
+            intent = analysis.intent
+            is_multi_entity = analysis.is_multi_entity
             
-            # Comprehensive signals
-            comprehensive_keywords = [
-                "everything", "all details", "all information", "complete", 
-                "comprehensive", "tell me about", "full details", "tell me everything",
-                "get details", "full status", "complete info"
-            ]
-            has_comprehensive_keyword = any(keyword in user_query for keyword in comprehensive_keywords)
-            
-            # 🔗 Cross-entity linking signals - queries that ask for relationships
-            cross_entity_keywords = [
-                "and their", "and its", "with their", "with its",
-                "related", "linked", "associated", "affected",
-                "along with", "together with"
-            ]
-            has_cross_entity_keyword = any(keyword in user_query for keyword in cross_entity_keywords)
+            # Comprehensive and 🔗 cross-entity keyword signals in a single pass
+            matched_categories = {match.lastgroup for match in self._KEYWORD_RE.finditer(user_query)}
+            has_comprehensive_keyword = "comprehensive" in matched_categories
+            has_cross_entity_keyword = "cross_entity" in matched_categories
             
             # Intent signals - "get details", "tell me about" often want comprehensive data
-            detailed_intent_keywords = ["get details", "tell me about", "full", "complete", "all"]
-            wants_details = any(keyword in intent for keyword in detailed_intent_keywords)
+            wants_details = bool(self._DETAILED_INTENT_RE.search(intent))
             
             # Decide if we need comprehensive followup
             should_expand = (
@@ -65,54 +120,50 @@ class ComprehensiveQueryAgent:
             )
             
             if not should_expand:
-                logger.info(f"⏭️  Not a comprehensive query (comprehensive={is_comprehensive}, scope={scope}, intent={intent}, multi_entity={is_multi_entity})")
+                logger.info("⏭️  Not a comprehensive query (comprehensive=%s, scope=%s, intent=%s, multi_entity=%s)",
+                            is_comprehensive, scope, intent, is_multi_entity)
                 return state
             
             # Check if we have search results with IDs
             mcp_results = state.get("mcp_results", [])
-            extracted_ids = self._extract_ids_from_results(mcp_results, llm_analysis)
+            extracted_ids = self._extract_ids_from_results(mcp_results)
             
-            if not extracted_ids:
+            if not extracted_ids.has_ids():
                 logger.info("⏭️  No IDs found in search results, skipping expansion")
                 return state
             
             # Log the type of expansion detected
-            has_cross_links = "linked_resource_ids" in extracted_ids or "linked_incident_ids" in extracted_ids
+            has_cross_links = bool(extracted_ids.linked_resource_ids or extracted_ids.linked_incident_ids)
             if has_cross_links:
-                logger.info(f"🔗 Cross-entity linking detected! Will fetch linked entities.")
+                logger.info("🔗 Cross-entity linking detected! Will fetch linked entities.")
             else:
-                logger.info(f"📋 Single-entity comprehensive query detected.")
+                logger.info("📋 Single-entity comprehensive query detected.")
             
             # Check if we already executed comprehensive tools
-            executed_tools = state.get("executed_tools", [])
-            comprehensive_tools = [
-                "get_resource_by_id", "get_resource_version", "get_resource_metadata",
-                "get_changelog_by_resource", "get_resource_tickets", "get_notifications_by_resource",
-                "get_incident_by_id", "get_incident_changelogs"
-            ]
-            
-            already_comprehensive = any(tool in executed_tools for tool in comprehensive_tools)
+            already_comprehensive = not self.COMPREHENSIVE_TOOLS.isdisjoint(state.get("executed_tools") or ())
             if already_comprehensive:
                 logger.info("⏭️  Comprehensive tools already executed, skipping expansion")
                 return state
             
             # Create follow-up query with the extracted ID
-            logger.info(f"🔄 Comprehensive query detected (comprehensive={is_comprehensive}, scope={scope}) with IDs: {extracted_ids}")
+            if logger.isEnabledFor(logging.INFO):
+                logger.info("🔄 Comprehensive query detected (comprehensive=%s, scope=%s) with IDs: %s",
+                            is_comprehensive, scope, extracted_ids.to_state())
             
             # Update state to indicate we need a follow-up comprehensive query
             state["needs_comprehensive_followup"] = True
-            state["extracted_ids"] = extracted_ids
+            state["extracted_ids"] = extracted_ids.to_state()
             
             return state
             
         except Exception as e:
-            logger.error(f"❌ Comprehensive query analysis failed: {e}")
+            logger.error("❌ Comprehensive query analysis failed: %s", e)
             return state
     
-    def _extract_ids_from_results(self, mcp_results: List[Dict], llm_analysis: Dict) -> Dict[str, Any]:
+    def _extract_ids_from_results(self, mcp_results: List[Dict]) -> ExtractedIds:
         """
         Extract resource/incident IDs from search results AND cross-entity references.
-        Returns dict with resource_id, incident_id, linked_resources, linked_incidents, etc.
+        Returns ExtractedIds with resource_id, incident_id, linked_resource_ids, linked_incident_ids, etc.
         
         Cross-Entity Linking:
         - Incidents → resource_mapping array → Linked resources
@@ -121,72 +172,101 @@ class ComprehensiveQueryAgent:
         """
         extracted = {}
         
+        # Each entity kind is taken from the first result that yields an ID; stop once all are found
+        pending = {self._extract_resource, self._extract_incident, self._extract_ticket}
+        
         try:
             for result in mcp_results:
                 if not result.get("success"):
                     continue
                 
                 tool_name = result.get("tool_name", "")
-                data = result.get("result", {})
-                
-                # Extract from search_resources
-                if "search_resources" in tool_name:
-                    resources = data.get("resources", [])
-                    if resources and len(resources) > 0:
-                        # Take the first matching resource
-                        resource = resources[0]
-                        resource_id = resource.get("id")
-                        if resource_id:
-                            extracted["resource_id"] = resource_id
-                            extracted["resource_name"] = resource.get("resourceName")
-                            logger.info(f"✅ Extracted resource_id: {resource_id} ({resource.get('resourceName')})")
-                
-                # Extract from search_incidents - including cross-entity resource links
-                elif "search_incidents" in tool_name:
-                    incidents = data.get("sample", []) or data.get("incidents", [])
-                    if incidents and len(incidents) > 0:
-                        incident = incidents[0]
-                        incident_id = incident.get("id")
-                        if incident_id:
-                            extracted["incident_id"] = incident_id
-                            extracted["incident_title"] = incident.get("title")
-                            logger.info(f"✅ Extracted incident_id: {incident_id} ({incident.get('title')})")
-                        
-                        # 🔗 CROSS-ENTITY LINKING: Extract linked resource IDs from incident
-                        resource_mapping = incident.get("resource_mapping", [])
-                        if resource_mapping and isinstance(resource_mapping, list):
-                            # Store linked resource IDs for follow-up queries
-                            extracted["linked_resource_ids"] = resource_mapping
-                            logger.info(f"🔗 Cross-entity link: Incident {incident_id} → Resources {resource_mapping}")
+                if tool_name not in self._extractors:
+                    self._extractors[tool_name] = self._match_extractor(tool_name)
                 
-                # Extract from search_tickets - including cross-entity links
-                elif "search_tickets" in tool_name or "ticket" in tool_name.lower():
-                    tickets = data.get("tickets", [])
-                    if tickets and len(tickets) > 0:
-                        ticket = tickets[0]
-                        ticket_id = ticket.get("id")
-                        if ticket_id:
-                            extracted["ticket_id"] = ticket_id
-                            logger.info(f"✅ Extracted ticket_id: {ticket_id}")
-                        
-                        # 🔗 CROSS-ENTITY LINKING: Extract linked resource/incident from ticket
-                        if ticket.get("resourceId"):
-                            if "linked_resource_ids" not in extracted:
-                                extracted["linked_resource_ids"] = []
-                            extracted["linked_resource_ids"].append(ticket.get("resourceId"))
-                            logger.info(f"🔗 Cross-entity link: Ticket {ticket_id} → Resource {ticket.get('resourceId')}")
-                        
-                        if ticket.get("incidentId"):
-                            if "linked_incident_ids" not in extracted:
-                                extracted["linked_incident_ids"] = []
-                            extracted["linked_incident_ids"].append(ticket.get("incidentId"))
-                            logger.info(f"🔗 Cross-entity link: Ticket {ticket_id} → Incident {ticket.get('incidentId')}")
+                extractor = self._extractors[tool_name]
+                if extractor in pending and extractor(result.get("result", {}), extracted):
+                    pending.discard(extractor)
+                    if not pending:
+                        break
             
-            return extracted
+            # Linked IDs are collected as ordered sets (dict keys) so follow-ups fetch each entity once
+            for key in ("linked_resource_ids", "linked_incident_ids"):
+                if key in extracted:
+                    extracted[key] = tuple(extracted[key])
+            
+            return ExtractedIds(**extracted)
             
         except Exception as e:
-            logger.error(f"❌ ID extraction failed: {e}")
-            return {}
+            logger.error("❌ ID extraction failed: %s", e)
+            return ExtractedIds()
+    
+    def _match_extractor(self, tool_name: str):
+        """Resolve the extractor for a tool name that is not an exact search tool match"""
+        if "search_resources" in tool_name:
+            return self._extract_resource
+        if "search_incidents" in tool_name:
+            return self._extract_incident
+        if "search_tickets" in tool_name or "ticket" in tool_name.lower():
+            return self._extract_ticket
+        return None
+    
+    def _extract_resource(self, data: Dict[str, Any], extracted: Dict[str, Any]) -> bool:
+        """Extract from search_resources. Returns True if a resource was found"""
+        resources = data.get("resources", [])
+        if resources and len(resources) > 0:
+            # Take the first matching resource
+            resource = resources[0]
+            resource_id = resource.get("id")
+            if resource_id:
+                extracted["resource_id"] = resource_id
+                extracted["resource_name"] = resource.get("resourceName")
+                logger.info("✅ Extracted resource_id: %s (%s)", resource_id, resource.get("resourceName"))
+                return True
+        return False
+    
+    def _extract_incident(self, data: Dict[str, Any], extracted: Dict[str, Any]) -> bool:
+        """Extract from search_incidents - including cross-entity resource links. Returns True if an incident was found"""
+        incidents = data.get("sample", []) or data.get("incidents", [])
+        if incidents and len(incidents) > 0:
+            incident = incidents[0]
+            incident_id = incident.get("id")
+            if incident_id:
+                extracted["incident_id"] = incident_id
+                extracted["incident_title"] = incident.get("title")
+                logger.info("✅ Extracted incident_id: %s (%s)", incident_id, incident.get("title"))
+            
+            # 🔗 CROSS-ENTITY LINKING: Extract linked resource IDs from incident
+            resource_mapping = incident.get("resource_mapping", [])
+            if resource_mapping and isinstance(resource_mapping, list):
+                # Store linked resource IDs for follow-up queries
+                extracted.setdefault("linked_resource_ids", {}).update(dict.fromkeys(resource_mapping))
+                logger.info("🔗 Cross-entity link: Incident %s → Resources %s", incident_id, resource_mapping)
+            return True
+        return False
+    
+    def _extract_ticket(self, data: Dict[str, Any], extracted: Dict[str, Any]) -> bool:
+        """Extract from search_tickets - including cross-entity links. Returns True if a ticket was found"""
+        tickets = data.get("tickets", [])
+        if tickets and len(tickets) > 0:
+            ticket = tickets[0]
+            ticket_id = ticket.get("id")
+            if ticket_id:
+                extracted["ticket_id"] = ticket_id
+                logger.info("✅ Extracted ticket_id: %s", ticket_id)
+            
+            # 🔗 CROSS-ENTITY LINKING: Extract linked resource/incident from ticket
+            linked_resource_id = ticket.get("resourceId")
+            if linked_resource_id:
+                extracted.setdefault("linked_resource_ids", {})[linked_resource_id] = None
+                logger.info("🔗 Cross-entity link: Ticket %s → Resource %s", ticket_id, linked_resource_id)
+            
+            linked_incident_id = ticket.get("incidentId")
+            if linked_incident_id:
+                extracted.setdefault("linked_incident_ids", {})[linked_incident_id] = None
+                logger.info("🔗 Cross-entity link: Ticket %s → Incident %s", ticket_id, linked_incident_id)
+            return True
+        return False
     
     async def create_followup_plan(self, state: Dict[str, Any]) -> Dict[str, Any]:
         """
@@ -201,64 +281,116 @@ class ComprehensiveQueryAgent:
             if not state.get("needs_comprehensive_followup"):
                 return state
             
-            extracted_ids = state.get("extracted_ids", {})
-            if not extracted_ids:
+            extracted_ids = ExtractedIds.from_state(state.get("extracted_ids"))
+            if not extracted_ids.has_ids():
                 return state
             
             # Build comprehensive tool plan based on extracted IDs
             followup_tools = []
             
             # Single-entity comprehensive resource query
-            if "resource_id" in extracted_ids:
-                resource_id = extracted_ids["resource_id"]
+            if extracted_ids.resource_id is not None:
+                resource_id = extracted_ids.resource_id
                 followup_tools.extend([
-                    {"name": "get_resource_by_id", "parameters": {"resource_id": resource_id}},
+                    # The primary lookup is required when it's the only entity - the rest of the plan describes it
+                    {"name": "get_resource_by_id", "parameters": {"resource_id": resource_id},
+                     "required": extracted_ids.incident_id is None},
                     {"name": "get_resource_version", "parameters": {"resource_id": resource_id}},
                     {"name": "get_resource_metadata", "parameters": {"resource_id": resource_id}},
                     {"name": "get_resource_tickets", "parameters": {"resource_id": resource_id}},
                     {"name": "get_changelog_by_resource", "parameters": {"resource_id": resource_id}},
                     {"name": "get_notifications_by_resource", "parameters": {"resource_id": resource_id}}
                 ])
-                logger.info(f"📋 Created comprehensive resource plan for ID: {resource_id}")
+                logger.info("📋 Created comprehensive resource plan for ID: %s", resource_id)
             
             # Single-entity comprehensive incident query
-            if "incident_id" in extracted_ids:
-                incident_id = extracted_ids["incident_id"]
+            if extracted_ids.incident_id is not None:
+                incident_id = extracted_ids.incident_id
                 followup_tools.extend([
-                    {"name": "get_incident_by_id", "parameters": {"incident_id": incident_id}},
+                    {"name": "get_incident_by_id", "parameters": {"incident_id": incident_id},
+                     "required": extracted_ids.resource_id is None},
                     {"name": "get_incident_changelogs", "parameters": {"incident_id": incident_id}}
                 ])
-                logger.info(f"📋 Created comprehensive incident plan for ID: {incident_id}")
+                logger.info("📋 Created comprehensive incident plan for ID: %s", incident_id)
             
             # 🔗 CROSS-ENTITY LINKING: Linked resource IDs from incidents/tickets
-            if "linked_resource_ids" in extracted_ids:
-                linked_resources = extracted_ids["linked_resource_ids"]
-                # Limit to first 5 resources to avoid overwhelming the system
-                for resource_id in linked_resources[:5]:
-                    followup_tools.append({
-                        "name": "get_resource_by_id", 
-                        "parameters": {"resource_id": resource_id}
-                    })
-                logger.info(f"🔗 Cross-entity plan: Fetching {len(linked_resources[:5])} linked resources")
+            # Skip the primary resource - it is already covered by the comprehensive plan above
+            linked_resource_tools = [
+                {"name": "get_resource_by_id", "parameters": {"resource_id": resource_id}}
+                for resource_id in extracted_ids.linked_resource_ids
+                if resource_id != extracted_ids.resource_id
+            ]
             
             # 🔗 CROSS-ENTITY LINKING: Linked incident IDs from tickets
-            if "linked_incident_ids" in extracted_ids:
-                linked_incidents = extracted_ids["linked_incident_ids"]
-                # Limit to first 5 incidents
-                for incident_id in linked_incidents[:5]:
-                    followup_tools.append({
-                        "name": "get_incident_by_id",
-                        "parameters": {"incident_id": incident_id}
-                    })
-                logger.info(f"🔗 Cross-entity plan: Fetching {len(linked_incidents[:5])} linked incidents")
+            linked_incident_tools = [
+                {"name": "get_incident_by_id", "parameters": {"incident_id": incident_id}}
+                for incident_id in extracted_ids.linked_incident_ids
+                if incident_id != extracted_ids.incident_id
+            ]
+            
+            if linked_resource_tools or linked_incident_tools:
+                # Fit as many linked lookups as the latency/token budget allows (in API order)
+                linked_tools, budget = self._select_within_budget(
+                    followup_tools,
+                    self._interleave(linked_resource_tools, linked_incident_tools)
+                )
+                followup_tools.extend(linked_tools)
+                state["followup_budget"] = budget
+                logger.info("🔗 Cross-entity plan: Fetching %d/%d linked entities (est. %.2fs, %d tokens)",
+                            budget["linked_selected"], budget["linked_available"],
+                            budget["estimated_wall_s"], budget["estimated_tokens"])
             
             if followup_tools:
+                # Follow-up tools are independent lookups, so mark them for concurrent dispatch
+                for tool in followup_tools:
+                    tool["parallel_group"] = "followup"
+                
                 # Add follow-up tools to the plan
                 state["followup_tool_plan"] = followup_tools
-                logger.info(f"✅ Follow-up plan created with {len(followup_tools)} tools")
+                state["followup_parallelism"] = {"mode": "gather", "max_concurrent": self.FOLLOWUP_MAX_CONCURRENT}
+                logger.info("✅ Follow-up plan created with %d tools", len(followup_tools))
             
             return state
             
         except Exception as e:
-            logger.error(f"❌ Follow-up plan creation failed: {e}")
+            logger.error("❌ Follow-up plan creation failed: %s", e)
             return state
+    
+    @staticmethod
+    def _interleave(*tool_lists: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Round-robin merge so one entity kind can't starve the other under a budget"""
+        merged = []
+        for group in zip_longest(*tool_lists):
+            merged.extend(tool for tool in group if tool is not None)
+        return merged
+    
+    def _select_within_budget(self, base_tools: List[Dict[str, Any]],
+                              candidates: List[Dict[str, Any]]) -> Tuple[List[Dict[str, Any]], Dict[str, Any]]:
+        """
+        Greedily pick candidate tools while the estimated follow-up cost stays within budget.
+        Wall time is estimated as total latency spread over the concurrency cap; the base
+        (single-entity comprehensive) tools are always executed and count against the budget.
+        """
+        latency = sum(self._tool_cost(tool["name"])[0] for tool in base_tools)
+        tokens = sum(self._tool_cost(tool["name"])[1] for tool in base_tools)
+        
+        selected = []
+        for tool in candidates:
+            tool_latency, tool_tokens = self._tool_cost(tool["name"])
+            if ((latency + tool_latency) / self.FOLLOWUP_MAX_CONCURRENT > self.FOLLOWUP_BUDGET_SECONDS
+                    or tokens + tool_tokens > self.FOLLOWUP_BUDGET_TOKENS):
+                break
+            latency += tool_latency
+            tokens += tool_tokens
+            selected.append(tool)
+        
+        return selected, {
+            "linked_selected": len(selected),
+            "linked_available": len(candidates),
+            "estimated_wall_s": round(latency / self.FOLLOWUP_MAX_CONCURRENT, 3),
+            "estimated_tokens": tokens
+        }
+    
+    def _tool_cost(self, tool_name: str) -> Tuple[float, int]:
+        """Estimated (latency seconds, response tokens) for a follow-up tool"""
+        return self.TOOL_COST_ESTIMATES.get(tool_name, self.DEFAULT_TOOL_COST)
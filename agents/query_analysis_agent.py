@@ -2,14 +2,41 @@
 Query Analysis Agent - Analyzes user queries to determine intent and plan execution
 """
 
+import asyncio
+import copy
+import hashlib
 import json
 import logging
-from typing import Dict, Any
-from state import ChatState, update_state_context
+import time
+from collections import OrderedDict
+from typing import Dict, Any, List, Optional, Tuple
+import config
+from state import ChatState
+from utils.disk_cache import DiskCache
 from utils.llm_client import llm_client
 
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson is optional, stdlib json works too
+    orjson = None
+
 logger = logging.getLogger(__name__)
 
+# LRU cache of (analysis, tool_plan) keyed by a hash of the query and the tool schemas
+_ANALYSIS_CACHE: "OrderedDict[bytes, Tuple[float, Dict[str, Any], List[Dict[str, Any]]]]" = OrderedDict()
+_ANALYSIS_CACHE_MAXSIZE = 2048
+_ANALYSIS_CACHE_TTL = 900  # 15 minutes
+
+# Persistent second-level cache so common queries stay warm across restarts/deploys
+_ANALYSIS_DISK_CACHE = (
+    DiskCache(
+        config.QUERY_ANALYSIS_CACHE_PATH,
+        ttl=config.QUERY_ANALYSIS_CACHE_TTL,
+        max_entries=config.QUERY_ANALYSIS_CACHE_MAX_ENTRIES
+    )
+    if config.QUERY_ANALYSIS_CACHE_PATH else None
+)
+
 
 class QueryAnalysisAgent:
     """
@@ -18,57 +45,150 @@ class QueryAnalysisAgent:
     
     def __init__(self):
         self.name = "QueryAnalysisAgent"
+        
+        # Fingerprint of the last tool schema list seen (schemas rarely change between queries)
+        self._schemas_ref = None
+        self._schemas_fingerprint = ""
+    
+    async def classify_intent(self, user_query: str) -> Dict[str, Any]:
+        """LLM intent analysis on its own - it doesn't depend on the tool list, so it can run while tools load"""
+        return await llm_client.analyze_query_intent(user_query, [])
+    
+    async def has_cached_analysis(self, user_query: str, tool_schemas: List[Dict[str, Any]]) -> bool:
+        """Whether analyze_query would be served from the cache for this query and tool schema list"""
+        return await self._lookup_analysis(self._cache_key(user_query, tool_schemas)) is not None
     
-    async def analyze_query(self, state: ChatState) -> ChatState:
-        """Analyze user query to determine intent and extract entities"""
+    async def analyze_query(self, state: ChatState, intent: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+        """
+        Analyze user query to determine intent and extract entities. Returns only the state keys to update.
+        A precomputed intent (from classify_intent) is used instead of a new LLM call on a cache miss.
+        """
         
         try:
-            logger.info(f"🔍 Analyzing query: '{state['user_query'][:50]}...'")
+            logger.info("🔍 Analyzing query: '%.50s...'", state["user_query"])
             
             # Use LLM to analyze query
             available_tools = state.get("available_tools", [])
             tool_schemas = state.get("tool_schemas", [])
-            analysis = await llm_client.analyze_query_intent(
-                state["user_query"],
-                available_tools
-            )
+            cache_key = self._cache_key(state["user_query"], tool_schemas)
+            cached = await self._lookup_analysis(cache_key)
             
-            # Plan tool sequence based on analysis (pass tool schemas)
-            tool_plan = await llm_client.plan_tool_sequence(
-                analysis,
-                tool_schemas,  # Pass full schemas instead of just names
-                state.get("context_data", {})
-            )
+            if cached:
+                analysis, tool_plan = cached
+                logger.info("⚡ Query analysis cache hit, skipping LLM analysis and planning")
+            else:
+                analysis = intent if intent is not None else await llm_client.analyze_query_intent(
+                    state["user_query"],
+                    available_tools
+                )
+                
+                # Plan tool sequence based on analysis (pass tool schemas)
+                tool_plan = await llm_client.plan_tool_sequence(
+                    analysis,
+                    tool_schemas,  # Pass full schemas instead of just names
+                    state.get("context_data", {})
+                )
+                
+                self._store_analysis(cache_key, analysis, tool_plan)
             
-            # Log tool plan for debugging
-            logger.info(f"📋 Tool plan: {json.dumps(tool_plan, indent=2)}")
+            # Log tool plan for debugging (serializing large plans is skipped unless INFO is on)
+            if logger.isEnabledFor(logging.INFO):
+                logger.info("📋 Tool plan: %s", self._format_tool_plan(tool_plan))
             
-            # Update state with analysis results
-            updated_state = {
-                **state,
+            # Update state with analysis results (only changed keys - LangGraph merges them)
+            updates = {
                 "query_type": analysis.get("query_type", "general"),
                 "intent": analysis.get("intent", "unknown"),
                 "entities": analysis.get("entities", []),
                 "confidence_score": analysis.get("confidence_score", 0.0),
                 "specificity_level": analysis.get("specificity_level", "medium"),
                 "tool_plan": tool_plan,
-                "current_agent": self.name
+                "current_agent": self.name,
+                # Store full analysis in context
+                "context_data": {
+                    **state.get("context_data", {}),
+                    "query_analysis": {
+                        "llm_analysis": analysis,
+                        "tool_plan": tool_plan
+                    }
+                }
             }
             
-            # Store full analysis in context
-            updated_state = update_state_context(updated_state, "query_analysis", {
-                "llm_analysis": analysis,
-                "tool_plan": tool_plan
-            })
-            
-            logger.info(f"✅ Query analyzed: type={analysis.get('query_type')}, confidence={analysis.get('confidence_score')}")
+            logger.info("✅ Query analyzed: type=%s, confidence=%s", analysis.get("query_type"), analysis.get("confidence_score"))
             
-            return updated_state
+            return updates
             
         except Exception as e:
-            logger.error(f"❌ Query analysis failed: {str(e)}")
+            logger.error("❌ Query analysis failed: %s", e)
             return {
-                **state,
                 "error_count": state.get("error_count", 0) + 1,
                 "workflow_status": "degraded"
             }
+    
+    def _format_tool_plan(self, tool_plan: List[Dict[str, Any]]) -> str:
+        """Pretty-print a tool plan for logging"""
+        if orjson:
+            return orjson.dumps(tool_plan, option=orjson.OPT_INDENT_2, default=str).decode()
+        return json.dumps(tool_plan, indent=2, default=str)
+    
+    def _cache_key(self, user_query: str, tool_schemas: List[Dict[str, Any]]) -> bytes:
+        """Build the analysis cache key from the query and a fingerprint of the tool schemas"""
+        if tool_schemas is not self._schemas_ref:
+            self._schemas_ref = tool_schemas
+            self._schemas_fingerprint = hashlib.blake2b(
+                json.dumps(tool_schemas, sort_keys=True, default=str).encode(),
+                digest_size=16
+            ).hexdigest()
+        
+        return hashlib.blake2b(
+            f"{user_query}|{self._schemas_fingerprint}".encode(),
+            digest_size=16
+        ).digest()
+    
+    async def _lookup_analysis(self, key: bytes) -> Optional[Tuple[Dict[str, Any], List[Dict[str, Any]]]]:
+        """Look up a cached analysis in memory first, then on disk (promoting disk hits to memory)"""
+        cached = self._get_cached_analysis(key)
+        if cached or _ANALYSIS_DISK_CACHE is None:
+            return cached
+        
+        entry = await asyncio.get_running_loop().run_in_executor(None, _ANALYSIS_DISK_CACHE.get, key)
+        if not entry:
+            return None
+        
+        analysis, tool_plan = entry
+        self._store_analysis(key, analysis, tool_plan, persist=False)
+        return analysis, tool_plan
+    
+    def _get_cached_analysis(self, key: bytes) -> Optional[Tuple[Dict[str, Any], List[Dict[str, Any]]]]:
+        """Return a copy of the cached (analysis, tool_plan) if present and fresh"""
+        entry = _ANALYSIS_CACHE.get(key)
+        if entry is None:
+            return None
+        
+        cached_at, analysis, tool_plan = entry
+        if time.monotonic() - cached_at >= _ANALYSIS_CACHE_TTL:
+            del _ANALYSIS_CACHE[key]
+            return None
+        
+        _ANALYSIS_CACHE.move_to_end(key)
+        return copy.deepcopy(analysis), copy.deepcopy(tool_plan)
+    
+    def _store_analysis(self, key: bytes, analysis: Dict[str, Any], tool_plan: List[Dict[str, Any]],
+                        persist: bool = True):
+        """Cache an LLM analysis, evicting the least recently used entry when full"""
+        # Fallback analyses (LLM unavailable) carry no intent - don't pin them in the cache
+        if "intent" not in analysis:
+            return
+        
+        entry = (time.monotonic(), copy.deepcopy(analysis), copy.deepcopy(tool_plan))
+        _ANALYSIS_CACHE[key] = entry
+        _ANALYSIS_CACHE.move_to_end(key)
+        if len(_ANALYSIS_CACHE) > _ANALYSIS_CACHE_MAXSIZE:
+            _ANALYSIS_CACHE.popitem(last=False)
+        
+        if persist and _ANALYSIS_DISK_CACHE is not None:
+            # Write-behind: the disk write runs in the executor without delaying the response.
+            # It serializes the cache's private copies, which callers never mutate
+            asyncio.get_running_loop().run_in_executor(
+                None, _ANALYSIS_DISK_CACHE.set, key, [entry[1], entry[2]]
+            )
@@ -3,19 +3,75 @@ Response Enrichment Agent - Enriches the final response with context and recomme
 """
 
 import logging
+import time
 from datetime import datetime
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, Iterator, List, Optional, Tuple
 from state import ChatState
+from utils import fast_json
 from utils.llm_client import llm_client
 
 logger = logging.getLogger(__name__)
 
+# (epoch second, isoformat, HH:MM:SS) - timestamps are reformatted at most once per second
+_timestamp_cache: Tuple[int, str, str] = (-1, "", "")
+
+
+def _cached_timestamps() -> Tuple[str, str]:
+    """Return (isoformat, HH:MM:SS) for the current second"""
+    global _timestamp_cache
+    second = int(time.time())
+    if _timestamp_cache[0] != second:
+        now = datetime.fromtimestamp(second)
+        _timestamp_cache = (second, now.isoformat(), now.strftime('%H:%M:%S'))
+    return _timestamp_cache[1], _timestamp_cache[2]
+
 
 class ResponseEnrichmentAgent:
     """
     Agent responsible for enriching responses with smart fallbacks and structured annotations
     """
     
+    __slots__ = ("name",)
+    
+    # Query-type link templates used when no service name or search terms are available
+    DEFAULT_LINKS_BY_QUERY_TYPE = {
+        "incident_analysis": ("Show active incidents", "Check system health", "View recent changes"),
+        "infrastructure_query": ("List all pods", "Show failed resources", "Check cluster status"),
+        "graph_query": ("Show database schema", "Count all nodes", "Explore relationships"),
+        "log_analysis": ("View error logs", "Check warning patterns", "Analyze log trends"),
+        "root_cause": ("Investigate timeline", "Check dependencies", "Review deployments")
+    }
+    FALLBACK_LINKS = ("View details", "Get help", "Refine query")
+    
+    # Smart fallback: result keys that hold item lists, and item fields tried as labels (in priority order)
+    FALLBACK_LIST_KEYS = ("incidents", "logs", "resources", "tickets", "changelogs", "notifications")
+    FALLBACK_LABEL_KEYS = ("title", "message", "name", "id")
+    
+    DEFAULT_RECOMMENDATIONS = (
+        "Review the analysis results",
+        "Monitor the situation",
+        "Consider follow-up actions if needed"
+    )
+    
+    # Annotation badges: icon per query type, and (threshold, type, icon) confidence tiers checked in order
+    QUERY_TYPE_ICONS = {
+        "incident_analysis": "alert-circle",
+        "infrastructure_query": "server",
+        "log_analysis": "file-text",
+        "graph_query": "share-2",
+        "root_cause": "search"
+    }
+    QUERY_TYPE_LABELS = {query_type: query_type.replace("_", " ").title() for query_type in QUERY_TYPE_ICONS}
+    CONFIDENCE_TIERS = (
+        (0.8, "success", "shield-check"),
+        (0.5, "warning", "shield"),
+        (0.0, "error", "shield-alert")
+    )
+    
+    # Fixed enrichment for conversational turns that ran no tools
+    CONVERSATIONAL_ANNOTATION = {"label": "Conversational", "type": "default", "icon": "message-circle"}
+    CONVERSATIONAL_ENRICHMENT_QUALITY = 0.3  # What _assess_enrichment_quality gives one annotation and no links
+    
     def __init__(self):
         self.name = "ResponseEnrichmentAgent"
     
@@ -23,14 +79,23 @@ class ResponseEnrichmentAgent:
         """Enrich the response with forward links, recommendations, and insights"""
         
         try:
+            # Fast path: conversational turns with no tool data skip the tool-grounded enrichment
+            if state.get("query_type") == "conversational" and not state.get("mcp_results"):
+                return await self._enrich_conversational(state)
+            
             logger.info("✨ Enriching response")
             
+            # Check if websocket is available for streaming (from workflow context)
+            websocket = state.get("_websocket_ref")
+            
+            # Resolve the LLM analysis once for the link and annotation helpers
+            query_analysis = ((state.get("context_data") or {}).get("query_analysis") or {}).get("llm_analysis") or {}
+            query_type = state.get("query_type") or ""
+            
             # Use LLM to generate enriched response
             try:
                 logger.info("🤖 Calling LLM to generate enriched response...")
                 
-                # Check if websocket is available for streaming (from workflow context)
-                websocket = state.get("_websocket_ref")
                 if websocket:
                     logger.info("🌊 Using streaming mode for response generation")
                     llm_response = await llm_client.generate_enriched_response(state, websocket=websocket)
@@ -38,7 +103,8 @@ class ResponseEnrichmentAgent:
                     logger.info("📝 Using non-streaming mode for response generation")
                     llm_response = await llm_client.generate_enriched_response(state)
                 
-                logger.info(f"🔍 LLM response type: {type(llm_response)}, value: {str(llm_response)[:200] if llm_response else 'None'}")
+                if logger.isEnabledFor(logging.INFO):
+                    logger.info("🔍 LLM response type: %s, value: %.200s", type(llm_response), llm_response)
                 
                 # Check if llm_response is None or not a dict
                 if llm_response is None:
@@ -51,23 +117,26 @@ class ResponseEnrichmentAgent:
                 recommendations = llm_response.get("recommendations", [])
                 insights = llm_response.get("insights", {})
                 
-                logger.info(f"📝 LLM generated response: {len(final_response)} chars")
+                logger.info("📝 LLM generated response: %d chars", len(final_response))
                 
             except Exception as llm_error:
-                logger.error(f"❌ LLM generation failed: {llm_error}. Engaging smart fallback.")
-                # Smart Fallback: Construct response from raw data
-                final_response = self._create_smart_fallback_response(state)
-                forward_links = self._generate_context_aware_links(state)
+                logger.error("❌ LLM generation failed: %s. Engaging smart fallback.", llm_error)
+                # Smart Fallback: Construct response from raw data (streamed to the client when connected)
+                if websocket:
+                    final_response = await self._stream_smart_fallback(state, websocket)
+                else:
+                    final_response = self._create_smart_fallback_response(state)
+                forward_links = self._generate_context_aware_links(query_analysis, query_type)
                 recommendations = self._generate_default_recommendations(state)
                 insights = {"error": "Generated via fallback logic due to LLM unavailability"}
             
             # Create structured annotations (better for frontend)
-            annotations = self._create_structured_annotations(state)
+            annotations = self._create_structured_annotations(state, query_analysis, query_type)
             
             # Quality Assessment & Logging
             quality_score = self._assess_enrichment_quality(forward_links, annotations)
             if quality_score < 0.5:
-                logger.warning(f"⚠️ Low enrichment quality score: {quality_score:.2f}")
+                logger.warning("⚠️ Low enrichment quality score: %.2f", quality_score)
             
             # Compile enrichment data
             enrichment_data = {
@@ -75,49 +144,83 @@ class ResponseEnrichmentAgent:
                 "annotations": annotations,
                 "contextual_insights": insights,
                 "recommendations": recommendations,
-                "enrichment_timestamp": datetime.now().isoformat(),
+                "enrichment_timestamp": _cached_timestamps()[0],
                 "enrichment_quality": quality_score
             }
             
             # Update state
-            updated_state = {
-                **state,
-                "enrichment_data": enrichment_data,
-                "forward_links": forward_links,
-                "annotations": annotations,
-                "final_response": final_response,
-                "current_agent": self.name
-            }
+            updated_state = state.copy()
+            updated_state["enrichment_data"] = enrichment_data
+            updated_state["forward_links"] = forward_links
+            updated_state["annotations"] = annotations
+            updated_state["final_response"] = final_response
+            updated_state["current_agent"] = self.name
             
-            logger.info(f"✅ Response enrichment completed with {len(forward_links)} forward links")
+            logger.info("✅ Response enrichment completed with %d forward links", len(forward_links))
             
             return updated_state
             
         except Exception as e:
-            logger.error(f"❌ Critical Enrichment Failure: {str(e)}")
+            logger.error("❌ Critical Enrichment Failure: %s", e)
             # Return basic response without enrichment using smart fallback
-            return {
-                **state,
-                "final_response": self._create_smart_fallback_response(state),
-                "error_count": state.get("error_count", 0) + 1,
-                "enrichment_data": {
-                    "error": str(e),
-                    "enrichment_quality": 0.0
-                }
+            updated_state = state.copy()
+            updated_state["final_response"] = self._create_smart_fallback_response(state)
+            updated_state["error_count"] = state.get("error_count", 0) + 1
+            updated_state["enrichment_data"] = {
+                "error": str(e),
+                "enrichment_quality": 0.0
             }
+            return updated_state
+    
+    async def _enrich_conversational(self, state: ChatState) -> ChatState:
+        """Reply from chat history only, with fixed enrichment (no links, metadata call or quality scoring)"""
+        logger.info("💬 Conversational query - using lightweight response path")
+        
+        final_response = await llm_client.generate_conversational_response(
+            state, websocket=state.get("_websocket_ref")
+        )
+        annotations = [dict(self.CONVERSATIONAL_ANNOTATION)]
+        
+        updated_state = state.copy()
+        updated_state["enrichment_data"] = {
+            "forward_links": [],
+            "annotations": annotations,
+            "contextual_insights": {},
+            "recommendations": [],
+            "enrichment_timestamp": _cached_timestamps()[0],
+            "enrichment_quality": self.CONVERSATIONAL_ENRICHMENT_QUALITY
+        }
+        updated_state["forward_links"] = []
+        updated_state["annotations"] = annotations
+        updated_state["final_response"] = final_response
+        updated_state["current_agent"] = self.name
+        return updated_state
     
     def _create_smart_fallback_response(self, state: ChatState) -> str:
         """
         Creates a readable response directly from tool data without LLM.
         Iterates through successful tools and extracts 'titles', 'messages', or 'names'.
         """
+        return "".join(self._iter_smart_fallback(state))
+    
+    async def _stream_smart_fallback(self, state: ChatState, websocket) -> str:
+        """Send the smart fallback to the client section by section and return the full text"""
+        sections = []
+        for section in self._iter_smart_fallback(state):
+            sections.append(section)
+            await websocket.send_text(fast_json.dumps({"on_chat_model_stream": section}))
+        return "".join(sections)
+    
+    def _iter_smart_fallback(self, state: ChatState) -> Iterator[str]:
+        """Yield the smart fallback response one section (per tool) at a time"""
         mcp_results = state.get("mcp_results", [])
         successful_tools = [r for r in mcp_results if r.get("success")]
         
         if not successful_tools:
-            return f"I attempted to analyze '{state.get('user_query')}', but the tools provided no data."
+            yield f"I attempted to analyze '{state.get('user_query')}', but the tools provided no data."
+            return
 
-        response_lines = [f"I executed {len(mcp_results)} tools. Here are the results:\n"]
+        yield f"I executed {len(mcp_results)} tools. Here are the results:\n"
 
         for result in successful_tools:
             tool_name = result.get("tool_name", "Unknown Tool")
@@ -125,42 +228,34 @@ class ResponseEnrichmentAgent:
             
             # Dynamic parsing based on common data shapes
             count = data.get("count", 0)
-            response_lines.append(f"\n**{tool_name}** ({count} items found):")
+            section_lines = [f"\n**{tool_name}** ({count} items found):"]
             
             # Try to find a list in the data (incidents, logs, resources)
-            found_list = None
-            for key in ["incidents", "logs", "resources", "tickets", "changelogs", "notifications"]:
-                if key in data and isinstance(data[key], list):
-                    found_list = data[key]
-                    break
+            found_list = next((data[key] for key in self.FALLBACK_LIST_KEYS if isinstance(data.get(key), list)), None)
             
             if found_list:
                 for item in found_list[:3]:  # Limit to top 3 for brevity
                     # Try to find a readable label
-                    label = (item.get("title") or item.get("message") or 
-                             item.get("name") or item.get("id") or "Item")
-                    response_lines.append(f"• {str(label)[:100]}")
+                    label = next((item[key] for key in self.FALLBACK_LABEL_KEYS if item.get(key)), "Item")
+                    section_lines.append(f"• {str(label)[:100]}")
                 if len(found_list) > 3:
-                    response_lines.append(f"• ...and {len(found_list) - 3} more.")
+                    section_lines.append(f"• ...and {len(found_list) - 3} more.")
             else:
-                response_lines.append("• Data available (view details).")
+                section_lines.append("• Data available (view details).")
             
-            response_lines.append("")  # spacer
-
-        return "\n".join(response_lines)
+            section_lines.append("")  # spacer
+            
+            # Sections are newline-separated, matching a single "\n".join over all lines
+            yield "\n" + "\n".join(section_lines)
     
-    def _generate_context_aware_links(self, state: ChatState) -> List[str]:
+    def _generate_context_aware_links(self, query_analysis: Dict[str, Any], query_type: str) -> List[str]:
         """
         Generate links using specific entities found in the query analysis.
         Uses strict_service_name if available for more relevant suggestions.
         """
-        context_data = state.get("context_data", {})
-        query_analysis = context_data.get("query_analysis", {})
-        
         # Use the "Smart Logic" strict_service_name if available
         service_name = query_analysis.get("strict_service_name")
-        query_type = state.get("query_type", "general")
-        search_terms = query_analysis.get("search_terms", [])
+        search_terms = query_analysis.get("search_terms") or []
 
         links = []
         
@@ -178,26 +273,16 @@ class ResponseEnrichmentAgent:
         
         # Priority 3: Fallback to query type templates
         if not links:
-            defaults = {
-                "incident_analysis": ["Show active incidents", "Check system health", "View recent changes"],
-                "infrastructure_query": ["List all pods", "Show failed resources", "Check cluster status"],
-                "graph_query": ["Show database schema", "Count all nodes", "Explore relationships"],
-                "log_analysis": ["View error logs", "Check warning patterns", "Analyze log trends"],
-                "root_cause": ["Investigate timeline", "Check dependencies", "Review deployments"]
-            }
-            links = defaults.get(query_type, ["View details", "Get help", "Refine query"])
+            return list(self.DEFAULT_LINKS_BY_QUERY_TYPE.get(query_type, self.FALLBACK_LINKS))
             
         return links[:4]  # Limit to 4 links for clean UI
     
     def _generate_default_recommendations(self, state: ChatState) -> List[str]:
         """Generate default recommendations"""
-        return [
-            "Review the analysis results",
-            "Monitor the situation",
-            "Consider follow-up actions if needed"
-        ]
+        return list(self.DEFAULT_RECOMMENDATIONS)
     
-    def _create_structured_annotations(self, state: ChatState) -> List[Dict[str, str]]:
+    def _create_structured_annotations(self, state: ChatState, query_analysis: Dict[str, Any],
+                                       query_type: str) -> List[Dict[str, str]]:
         """
         Create structured annotations for the UI.
         Returns dictionaries with label, type, and icon for frontend rendering as badges/chips.
@@ -215,21 +300,13 @@ class ResponseEnrichmentAgent:
             })
         
         # Confidence Badge
-        context_data = state.get("context_data", {})
-        query_analysis = context_data.get("query_analysis", {})
         confidence = query_analysis.get("confidence_score", 0)
         
-        if confidence > 0:
-            if confidence > 0.8:
-                confidence_type = "success"
-                confidence_icon = "shield-check"
-            elif confidence > 0.5:
-                confidence_type = "warning"
-                confidence_icon = "shield"
-            else:
-                confidence_type = "error"
-                confidence_icon = "shield-alert"
-                
+        if isinstance(confidence, (int, float)) and confidence > 0:
+            _, confidence_type, confidence_icon = next(
+                tier for tier in self.CONFIDENCE_TIERS if confidence > tier[0]
+            )
+            
             annotations.append({
                 "label": f"{confidence:.0%} Confidence",
                 "type": confidence_type,
@@ -237,19 +314,11 @@ class ResponseEnrichmentAgent:
             })
         
         # Query Type Badge
-        query_type = state.get("query_type", "")
         if query_type:
-            type_icons = {
-                "incident_analysis": "alert-circle",
-                "infrastructure_query": "server",
-                "log_analysis": "file-text",
-                "graph_query": "share-2",
-                "root_cause": "search"
-            }
             annotations.append({
-                "label": query_type.replace("_", " ").title(),
+                "label": self.QUERY_TYPE_LABELS.get(query_type) or query_type.replace("_", " ").title(),
                 "type": "default",
-                "icon": type_icons.get(query_type, "help-circle")
+                "icon": self.QUERY_TYPE_ICONS.get(query_type, "help-circle")
             })
         
         # Service Badge (if strict_service_name found)
@@ -263,7 +332,7 @@ class ResponseEnrichmentAgent:
         
         # Timestamp Badge
         annotations.append({
-            "label": datetime.now().strftime('%H:%M:%S'),
+            "label": _cached_timestamps()[1],
             "type": "default",
             "icon": "clock"
         })
@@ -2,23 +2,59 @@
 Tool Execution Agent - Executes MCP tools based on the plan
 """
 
+import asyncio
 import logging
-from typing import Dict, Any
-from state import ChatState, add_mcp_result
+from typing import Dict, Any, List
+from state import ChatState, add_mcp_results
 from utils.mcp_client import MCPClientManager
+from utils.session_store import SessionStore
 
 logger = logging.getLogger(__name__)
 
 
+class RequiredToolFailed(Exception):
+    """Raised inside a tool wave when a plan entry marked "required" fails"""
+    
+    def __init__(self, tool_name: str):
+        super().__init__(f"Required tool {tool_name} failed")
+        self.tool_name = tool_name
+
+
 class ToolExecutionAgent:
     """
     Agent responsible for executing MCP tools
     """
     
+    __slots__ = ("name", "mcp_client", "max_retries", "_client_cache", "_client_cache_lock")
+    
+    # Upper bound on in-flight MCP calls so the server isn't flooded
+    MAX_CONCURRENT_TOOLS = 8
+    
+    # Per-session MCP client cache limits (entries expire CLIENT_CACHE_TTL seconds after they were resolved)
+    CLIENT_CACHE_MAX_SESSIONS = 1024
+    CLIENT_CACHE_TTL = 300
+    
+    # Required parameter for each tool that must not be None, "undefined" or empty
+    REQUIRED_PARAM_BY_TOOL = {
+        **dict.fromkeys((
+            "get_resource_by_id", "get_resource_tickets", "get_resource_version",
+            "get_resource_metadata", "get_changelog_by_resource",
+            "get_changelog_list_by_resource", "get_notifications_by_resource"
+        ), "resource_id"),
+        **dict.fromkeys(("get_incident_by_id", "get_incident_changelogs", "get_incident_curated"), "incident_id"),
+        "get_ticket_by_id": "ticket_id",
+        **dict.fromkeys(("search_incidents", "search_resources", "search_tickets", "query_logs", "query_metrics"), "query"),
+    }
+    
     def __init__(self, mcp_client_manager: MCPClientManager):
         self.name = "ToolExecutionAgent"
         self.mcp_client = mcp_client_manager
         self.max_retries = 2
+        
+        # MCP clients resolved per session, so a plan looks its client up once instead of per tool attempt.
+        # Bounded and idle-expiring so sessions that stop sending queries don't accumulate
+        self._client_cache = SessionStore(maxsize=self.CLIENT_CACHE_MAX_SESSIONS, ttl=self.CLIENT_CACHE_TTL)
+        self._client_cache_lock = asyncio.Lock()
     
     async def execute_tools(self, state: ChatState) -> ChatState:
         """Execute tools according to the plan"""
@@ -27,72 +63,157 @@ class ToolExecutionAgent:
             # Skip tool execution for conversational queries
             if state.get("query_type") == "conversational":
                 logger.info("💬 Skipping tool execution for conversational query")
-                return {
-                    **state,
-                    "workflow_status": "completed",
-                    "current_agent": self.name
-                }
+                updated_state = state.copy()
+                updated_state["workflow_status"] = "completed"
+                updated_state["current_agent"] = self.name
+                return updated_state
             
             tool_plan = state.get("tool_plan", [])
-            logger.info(f"🛠️ Executing {len(tool_plan)} tools")
+            logger.info("🛠️ Executing %d tools", len(tool_plan))
             
-            # Execute tools according to plan
-            current_state = state
-            for tool_info in tool_plan:
-                tool_result = await self._execute_single_tool_with_retry(
-                    tool_info,
-                    current_state
-                )
-                
-                # Add result to state
-                current_state = add_mcp_result(
-                    current_state,
-                    tool_info["name"],
-                    tool_result,
-                    self.name
-                )
+            # Independent tools run concurrently; the follow-up plan may set its own concurrency cap
+            parallelism = state.get("followup_parallelism") or {}
+            tool_results = await self._execute_tools_concurrently(
+                tool_plan,
+                state,
+                parallelism.get("max_concurrent", self.MAX_CONCURRENT_TOOLS)
+            )
+            
+            # Merge all results into state at once, in plan order
+            current_state = add_mcp_results(
+                state,
+                ((tool_info["name"], tool_result) for tool_info, tool_result in zip(tool_plan, tool_results)),
+                self.name
+            )
             
             # Calculate execution statistics
             mcp_results = current_state.get("mcp_results", [])
-            success_count = len([r for r in mcp_results if r.get("success")])
+            success_count = sum(1 for r in mcp_results if r.get("success"))
             success_rate = success_count / len(mcp_results) if mcp_results else 0
             
-            logger.info(f"✅ Tool execution completed: {success_rate:.2%} success rate")
+            logger.info("✅ Tool execution completed: %.2f%% success rate", success_rate * 100)
             
-            return {
-                **current_state,
-                "current_agent": self.name
-            }
+            updated_state = current_state.copy()
+            updated_state["current_agent"] = self.name
+            return updated_state
             
         except Exception as e:
-            logger.error(f"❌ Tool execution failed: {str(e)}")
-            return {
-                **state,
-                "error_count": state.get("error_count", 0) + 1,
-                "workflow_status": "degraded"
-            }
+            logger.error("❌ Tool execution failed: %s", e)
+            updated_state = state.copy()
+            updated_state["error_count"] = state.get("error_count", 0) + 1
+            updated_state["workflow_status"] = "degraded"
+            return updated_state
     
-    async def _execute_single_tool_with_retry(self, tool_info: Dict[str, Any], state: ChatState) -> Dict[str, Any]:
-        """Execute a single tool with retry logic"""
+    async def _execute_tools_concurrently(self, tool_plan: List[Dict[str, Any]], state: ChatState,
+                                          max_concurrent: int) -> List[Dict[str, Any]]:
+        """Execute tools concurrently, bounded by max_concurrent, preserving plan order.
+        Tools listing earlier tool names in "depends_on" wait until those have finished.
+        If a tool marked "required" fails, its in-flight siblings are cancelled and later waves skipped."""
         
-        tool_name = tool_info.get("name")
-        parameters = tool_info.get("parameters", {})
+        # Tools with missing/invalid required parameters fail fast here and never take a network slot
+        results: List[Any] = [None] * len(tool_plan)
+        runnable = [False] * len(tool_plan)
+        for i, tool_info in enumerate(tool_plan):
+            tool_name = tool_info.get("name")
+            parameters = tool_info.get("parameters", {})
+            if self._validate_parameters(tool_name, parameters):
+                runnable[i] = True
+            else:
+                logger.error("❌ Tool %s has invalid or missing required parameters: %s", tool_name, parameters)
+                results[i] = {
+                    "success": False,
+                    "error": f"Missing or invalid required parameters for {tool_name}",
+                    "tool_name": tool_name
+                }
         
-        # Validate required parameters before attempting execution
-        if not self._validate_parameters(tool_name, parameters):
-            logger.error(f"❌ Tool {tool_name} has invalid or missing required parameters: {parameters}")
-            return {
+        waves = [[i for i in wave if runnable[i]] for wave in self._dependency_waves(tool_plan)]
+        waves = [wave for wave in waves if wave]
+        logger.info("⚡ Dispatching %d tools concurrently in %d wave(s) (max %d in flight)",
+                    sum(runnable), len(waves), max_concurrent)
+        if not waves:
+            return results
+        
+        semaphore = asyncio.Semaphore(max_concurrent)
+        
+        # Resolve the session's client once for the whole plan; tools fetch their own if this fails
+        client = None
+        try:
+            client = await self._get_cached_client(state.get("session_id", "default"))
+        except Exception as e:
+            logger.warning("⚠️ Could not resolve MCP client up front: %s", e)
+        
+        async def run(i: int):
+            tool_info = tool_plan[i]
+            try:
+                async with semaphore:
+                    results[i] = await self._execute_single_tool_with_retry(tool_info, state, client)
+            except Exception as e:
+                results[i] = {"success": False, "error": str(e), "tool_name": tool_info.get("name")}
+            
+            # A failed required tool makes the rest of the plan pointless - abort its siblings
+            if tool_info.get("required") is True and not results[i].get("success"):
+                raise RequiredToolFailed(tool_info.get("name"))
+        
+        failed_tool = None
+        for wave in waves:
+            try:
+                async with asyncio.TaskGroup() as task_group:
+                    for i in wave:
+                        task_group.create_task(run(i))
+            except* RequiredToolFailed as failures:
+                failed_tool = failures.exceptions[0].tool_name
+            
+            if failed_tool:
+                logger.warning("🛑 Required tool %s failed, aborting remaining tools", failed_tool)
+                break
+        
+        # Tools cancelled mid-flight or never started after an abort have no result
+        return [
+            result if result is not None else {
                 "success": False,
-                "error": f"Missing or invalid required parameters for {tool_name}",
-                "tool_name": tool_name
+                "error": "aborted",
+                "tool_name": tool_info.get("name")
             }
+            for tool_info, result in zip(tool_plan, results)
+        ]
+    
+    @staticmethod
+    def _dependency_waves(tool_plan: List[Dict[str, Any]]) -> List[List[int]]:
+        """Group plan indices into waves; a tool runs one wave after the latest earlier tool it depends on"""
+        
+        waves: List[List[int]] = []
+        latest_wave_by_name: Dict[str, int] = {}
+        
+        for i, tool_info in enumerate(tool_plan):
+            depends_on = tool_info.get("depends_on") or ()
+            if isinstance(depends_on, str):
+                depends_on = (depends_on,)
+            wave = max((latest_wave_by_name[name] + 1 for name in depends_on if name in latest_wave_by_name), default=0)
+            
+            if wave == len(waves):
+                waves.append([])
+            waves[wave].append(i)
+            
+            name = tool_info.get("name")
+            latest_wave_by_name[name] = max(wave, latest_wave_by_name.get(name, 0))
+        
+        return waves
+    
+    async def _execute_single_tool_with_retry(self, tool_info: Dict[str, Any], state: ChatState,
+                                              client: Any = None) -> Dict[str, Any]:
+        """Execute a single tool with retry logic (parameters are validated by the caller)"""
+        
+        session_id = state.get("session_id", "default")
+        tool_name = tool_info.get("name")
+        parameters = tool_info.get("parameters", {})
         
         for attempt in range(self.max_retries):
             try:
-                logger.info(f"🔧 Executing {tool_name} (attempt {attempt + 1}/{self.max_retries})")
+                logger.info("🔧 Executing %s (attempt %d/%d)", tool_name, attempt + 1, self.max_retries)
                 
-                # Get MCP client for this session
-                client = await self.mcp_client.get_client(state.get("session_id", "default"))
+                # Get MCP client for this session (re-resolved after a failed attempt)
+                if client is None:
+                    client = await self._get_cached_client(session_id)
                 
                 # Execute the tool
                 result = await client.execute_tool(tool_name, parameters)
@@ -100,55 +221,46 @@ class ToolExecutionAgent:
                 return result
                 
             except Exception as e:
+                self._client_cache.pop(session_id, None)
+                client = None
                 if attempt < self.max_retries - 1:
-                    logger.warning(f"⚠️ Tool {tool_name} attempt {attempt + 1} failed: {str(e)}, retrying...")
+                    logger.warning("⚠️ Tool %s attempt %d failed: %s, retrying...", tool_name, attempt + 1, e)
                 else:
-                    logger.error(f"❌ Tool {tool_name} failed after {self.max_retries} attempts: {str(e)}")
+                    logger.error("❌ Tool %s failed after %d attempts: %s", tool_name, self.max_retries, e)
                     return {
                         "success": False,
                         "error": str(e),
                         "tool_name": tool_name
                     }
     
+    async def _get_cached_client(self, session_id: str) -> Any:
+        """Return the MCP client for session_id, asking the manager only on a cache miss"""
+        client = self._client_cache.get(session_id)
+        if client is not None:
+            return client
+        
+        async with self._client_cache_lock:
+            client = self._client_cache.get(session_id)
+            if client is None:
+                client = await self.mcp_client.get_client(session_id)
+                self._client_cache[session_id] = client
+            return client
+    
+    def clear_client_cache(self):
+        """Forget all resolved MCP clients (e.g. when the manager closes them)"""
+        self._client_cache.clear()
+    
     def _validate_parameters(self, tool_name: str, parameters: Dict[str, Any]) -> bool:
         """Validate tool parameters - check for None, undefined, or empty required params"""
         
-        # Tools that require resource_id as integer
-        resource_id_tools = [
-            "get_resource_by_id", "get_resource_tickets", "get_resource_version",
-            "get_resource_metadata", "get_changelog_by_resource", 
-            "get_changelog_list_by_resource", "get_notifications_by_resource"
-        ]
+        required_param = self.REQUIRED_PARAM_BY_TOOL.get(tool_name)
+        if required_param is None:
+            return True
         
-        if tool_name in resource_id_tools:
-            resource_id = parameters.get("resource_id")
-            if resource_id is None or resource_id == "undefined" or resource_id == "":
-                logger.warning(f"⚠️ {tool_name} missing valid resource_id: {resource_id}")
-                return False
-        
-        # Tools that require incident_id
-        incident_id_tools = ["get_incident_by_id", "get_incident_changelogs", "get_incident_curated"]
-        
-        if tool_name in incident_id_tools:
-            incident_id = parameters.get("incident_id")
-            if incident_id is None or incident_id == "undefined" or incident_id == "":
-                logger.warning(f"⚠️ {tool_name} missing valid incident_id: {incident_id}")
-                return False
-        
-        # Tools that require ticket_id
-        if tool_name == "get_ticket_by_id":
-            ticket_id = parameters.get("ticket_id")
-            if ticket_id is None or ticket_id == "undefined" or ticket_id == "":
-                logger.warning(f"⚠️ {tool_name} missing valid ticket_id: {ticket_id}")
-                return False
-        
-        # Tools that require query parameter
-        query_tools = ["search_incidents", "search_resources", "search_tickets", "query_logs", "query_metrics"]
-        
-        if tool_name in query_tools:
-            query = parameters.get("query")
-            if query is None or query == "undefined" or query == "":
-                logger.warning(f"⚠️ {tool_name} missing valid query: {query}")
-                return False
+        value = parameters.get(required_param)
+        if value is None or value == "undefined" or value == "":
+            if logger.isEnabledFor(logging.WARNING):
+                logger.warning("⚠️ %s missing valid %s: %r", tool_name, required_param, value)
+            return False
         
         return True
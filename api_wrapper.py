@@ -13,20 +13,47 @@ This wrapper provides:
 """
 
 from fastapi import FastAPI, WebSocket, WebSocketDisconnect, HTTPException, Header, Depends
-from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel, Field
+from fastapi.responses import JSONResponse, Response
+from pydantic import BaseModel, ConfigDict, Field
+from starlette.middleware.cors import CORSMiddleware
 from typing import Optional, List, Dict, Any
 import asyncio
-import json
+import hashlib
 import logging
+import secrets
 from datetime import datetime
+from types import MappingProxyType
 
 # Import your existing server components
 from graph import create_workflow
 from utils.llm_client import LLMDecisionMaker
+from utils import fast_json
+from utils.session_store import SessionStore
 
 logger = logging.getLogger(__name__)
 
+# Fixed parts of the websocket ack and completion frames - only the session id / metadata are encoded per frame
+_ACK_PREFIX = '{"status":"connected","session_id":'
+_END_PREFIX = '{"on_chat_model_end":true,"metadata":'
+
+# Shared read-only defaults so missing request/result fields don't allocate per request
+_EMPTY_CONTEXT = MappingProxyType({})
+_NO_ITEMS = ()
+
+# Keep-alive frames are recognised by prefix and dropped without being parsed
+_PING_PREFIXES = ('{"ping"', b'{"ping"')
+
+# ============================================================================
+# JSON RENDERING
+# ============================================================================
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse rendered with utils.fast_json (orjson when it is installed)"""
+    
+    def render(self, content: Any) -> bytes:
+        return fast_json.dumpb(content)
+
+
 # ============================================================================
 # REQUEST/RESPONSE MODELS
 # ============================================================================
@@ -38,15 +65,14 @@ class ChatRequest(BaseModel):
     context: Optional[Dict[str, Any]] = Field(None, description="Additional context for the query")
     stream: bool = Field(True, description="Enable streaming response")
     
-    class Config:
-        json_schema_extra = {
-            "example": {
-                "message": "Show me all pods in CrashLoopBackOff",
-                "session_id": "user-session-123",
-                "context": {"namespace": "production"},
-                "stream": True
-            }
+    model_config = ConfigDict(json_schema_extra={
+        "example": {
+            "message": "Show me all pods in CrashLoopBackOff",
+            "session_id": "user-session-123",
+            "context": {"namespace": "production"},
+            "stream": True
         }
+    })
 
 
 class ChatResponse(BaseModel):
@@ -57,16 +83,15 @@ class ChatResponse(BaseModel):
     metadata: Optional[Dict[str, Any]] = Field(None, description="Additional metadata (tools used, etc.)")
     forward_links: Optional[List[str]] = Field(None, description="Suggested follow-up questions")
     
-    class Config:
-        json_schema_extra = {
-            "example": {
-                "response": "Found 3 pods in CrashLoopBackOff status...",
-                "session_id": "user-session-123",
-                "timestamp": "2025-12-01T10:30:00Z",
-                "metadata": {"tools_used": ["get_resources"], "execution_time": 1.5},
-                "forward_links": ["Show me the logs for these pods", "What caused these crashes?"]
-            }
+    model_config = ConfigDict(json_schema_extra={
+        "example": {
+            "response": "Found 3 pods in CrashLoopBackOff status...",
+            "session_id": "user-session-123",
+            "timestamp": "2025-12-01T10:30:00Z",
+            "metadata": {"tools_used": ["get_resources"], "execution_time": 1.5},
+            "forward_links": ["Show me the logs for these pods", "What caused these crashes?"]
         }
+    })
 
 
 class HealthResponse(BaseModel):
@@ -89,20 +114,42 @@ class ErrorResponse(BaseModel):
 # AUTHENTICATION (Ready to integrate)
 # ============================================================================
 
-async def verify_api_key(x_api_key: Optional[str] = Header(None)):
+# Digests of keys that passed validation recently, so hot keys skip the (eventually DB/JWT-backed) check.
+# Keyed by digest so raw API keys aren't held in process memory
+_API_KEY_CACHE = SessionStore(maxsize=1024, ttl=300)
+
+
+def _validate_api_key(x_api_key: str) -> bool:
     """
-    Verify API key from request header.
+    Check an API key against the auth backend.
     Replace with your company's authentication mechanism.
     """
     # TODO: Implement your authentication logic
-    # For now, this is a passthrough
+    # For now, every key is accepted
+    return True
+
+
+async def verify_api_key(x_api_key: Optional[str] = Header(None)):
+    """
+    Verify API key from request header.
+    Successful validations are cached for the cache TTL.
+    """
+    # For now, a missing key is a passthrough
     
     # Example implementation:
     # if not x_api_key:
     #     raise HTTPException(status_code=401, detail="API key required")
-    # if not validate_api_key(x_api_key):
-    #     raise HTTPException(status_code=403, detail="Invalid API key")
+    if not x_api_key:
+        return x_api_key
+    
+    key_digest = hashlib.blake2b(x_api_key.encode(), digest_size=16).digest()
+    if key_digest in _API_KEY_CACHE:
+        return x_api_key
+    
+    if not _validate_api_key(x_api_key):
+        raise HTTPException(status_code=403, detail="Invalid API key")
     
+    _API_KEY_CACHE[key_digest] = True
     return x_api_key
 
 
@@ -123,6 +170,37 @@ class LangGraphAPIWrapper:
     - Authentication hooks
     """
     
+    # Dependency status reported by /health
+    HEALTH_SERVICES = {
+        "langgraph": "operational",
+        "llm": "operational",
+        "mcp_server": "operational"
+    }
+    
+    # Static payload served by /api/capabilities
+    CAPABILITIES = {
+        "supported_queries": [
+            "infrastructure (pods, containers, resources)",
+            "incidents and alerts",
+            "tickets and service requests",
+            "changelogs and deployments",
+            "logs and monitoring"
+        ],
+        "features": [
+            "streaming_responses",
+            "multi_tool_orchestration",
+            "smart_filtering",
+            "context_aware_responses"
+        ],
+        "available_tools": [
+            "get_resources", "search_resources",
+            "get_incidents", "search_incidents",
+            "get_tickets", "search_tickets",
+            "get_changelogs", "search_changelogs",
+            "search_logs", "query_logs"
+        ]
+    }
+    
     def __init__(self, 
                  title: str = "LangGraph Chat API",
                  version: str = "1.0.0",
@@ -133,7 +211,7 @@ class LangGraphAPIWrapper:
         Args:
             title: API title
             version: API version
-            allowed_origins: List of allowed CORS origins (default: ["*"])
+            allowed_origins: List of allowed CORS origins (default: ["*"], which disables credentials)
         """
         self.app = FastAPI(
             title=title,
@@ -141,22 +219,43 @@ class LangGraphAPIWrapper:
             description="Production-ready API for LangGraph chat interactions",
             docs_url="/api/docs",
             redoc_url="/api/redoc",
-            openapi_url="/api/openapi.json"
+            openapi_url="/api/openapi.json",
+            default_response_class=FastJSONResponse
         )
         
         # Configure CORS
+        # Wildcard origins can't be combined with credentials (browsers reject it), so a "*"
+        # config gets the plain wildcard header; concrete origins get credentialed CORS
+        origins = list(dict.fromkeys(allowed_origins or ["*"]))
+        allow_all = "*" in origins
+        if allow_all and len(origins) > 1:
+            logger.warning(f"⚠️ CORS origins {origins} include '*'; allowing all origins without credentials")
         self.app.add_middleware(
             CORSMiddleware,
-            allow_origins=allowed_origins or ["*"],
-            allow_credentials=True,
+            allow_origins=["*"] if allow_all else origins,
+            allow_origin_regex=None,
+            allow_credentials=not allow_all,
             allow_methods=["*"],
             allow_headers=["*"],
         )
         
+        self._version = version
+        
+        # Health/status/capabilities bodies are constant apart from a timestamp or session count,
+        # so they are serialized once here and only the dynamic value is spliced in per request
+        version_json = fast_json.dumps(version)
+        self._capabilities_body = fast_json.dumps(self.CAPABILITIES).encode()
+        self._health_prefix = (
+            '{"status":"healthy","version":' + version_json +
+            ',"services":' + fast_json.dumps(self.HEALTH_SERVICES) + ',"timestamp":'
+        ).encode()
+        self._status_prefix = b'{"status":"operational","active_sessions":'
+        self._status_suffix = (',"uptime":"N/A","version":' + version_json + '}').encode()
+        
         # Initialize components
         self.workflow = create_workflow()
         self.llm_client = LLMDecisionMaker()
-        self.active_sessions: Dict[str, Any] = {}
+        self.active_sessions = SessionStore()  # session_id -> (last_activity datetime, message_count)
         
         # Register routes
         self._register_routes()
@@ -177,15 +276,8 @@ class LangGraphAPIWrapper:
             Health check endpoint.
             Returns status of the service and its dependencies.
             """
-            return HealthResponse(
-                status="healthy",
-                version=self.app.version,
-                services={
-                    "langgraph": "operational",
-                    "llm": "operational",
-                    "mcp_server": "operational"
-                }
-            )
+            timestamp = fast_json.dumps(datetime.now().isoformat()).encode()
+            return Response(content=self._health_prefix + timestamp + b"}", media_type="application/json")
         
         
         @self.app.get("/api/status", tags=["Health"])
@@ -193,20 +285,20 @@ class LangGraphAPIWrapper:
             """
             Get detailed service status including active sessions.
             """
-            return {
-                "status": "operational",
-                "active_sessions": len(self.active_sessions),
-                "uptime": "N/A",  # TODO: Track uptime
-                "version": self.app.version
-            }
+            # TODO: Track uptime
+            body = self._status_prefix + str(len(self.active_sessions)).encode() + self._status_suffix
+            return Response(content=body, media_type="application/json")
         
         
         # =====================================================================
         # CHAT ENDPOINTS (RESTful)
         # =====================================================================
         
+        # The response is built from trusted workflow output, so it's returned directly instead of
+        # being re-validated through ChatResponse (which still documents the 200 response)
         @self.app.post("/api/chat", 
-                      response_model=ChatResponse,
+                      response_model=None,
+                      responses={200: {"model": ChatResponse}},
                       tags=["Chat"],
                       dependencies=[Depends(verify_api_key)])
         async def chat(request: ChatRequest):
@@ -221,33 +313,33 @@ class LangGraphAPIWrapper:
             **Rate Limiting**: TODO: Implement rate limiting
             """
             try:
-                session_id = request.session_id or f"session-{datetime.now().timestamp()}"
+                session_id = request.session_id or f"session-{secrets.token_hex(8)}"
+                now = datetime.now()  # One clock read for the response timestamp and session activity
                 
                 # Process query through LangGraph workflow
                 state = {
                     "user_query": request.message,
                     "user_uuid": session_id,
-                    "context": request.context or {}
+                    "context": request.context if request.context is not None else _EMPTY_CONTEXT
                 }
                 
                 # Execute workflow (non-streaming)
                 result = await self.workflow.ainvoke(state)
                 
-                response = ChatResponse(
-                    response=result.get("final_response", "No response generated"),
-                    session_id=session_id,
-                    metadata={
-                        "tools_used": result.get("executed_tools", []),
+                response = FastJSONResponse(content={
+                    "response": result.get("final_response", "No response generated"),
+                    "session_id": session_id,
+                    "timestamp": now.isoformat(),
+                    "metadata": {
+                        "tools_used": result.get("executed_tools", _NO_ITEMS),
                         "query_type": result.get("query_type", "unknown")
                     },
-                    forward_links=result.get("forward_links", [])
-                )
+                    "forward_links": result.get("forward_links", _NO_ITEMS)
+                })
                 
                 # Store session
-                self.active_sessions[session_id] = {
-                    "last_activity": datetime.now(),
-                    "message_count": self.active_sessions.get(session_id, {}).get("message_count", 0) + 1
-                }
+                _, message_count = self.active_sessions.get(session_id, (None, 0))
+                self.active_sessions[session_id] = (now, message_count + 1)
                 
                 return response
                 
@@ -280,20 +372,26 @@ class LangGraphAPIWrapper:
             """
             await websocket.accept()
             session_id = None
+            receive = websocket.receive
+            send = websocket.send_text
             
             try:
                 while True:
-                    # Receive message from client
-                    data = await websocket.receive_text()
-                    message_data = json.loads(data)
+                    # Receive message from client (text or binary frame, parsed without a decode step)
+                    message = await receive()
+                    if message["type"] == "websocket.disconnect":
+                        raise WebSocketDisconnect(message.get("code", 1000))
+                    data = message.get("text")
+                    if data is None:
+                        data = message.get("bytes")
+                    if not data or data.startswith(_PING_PREFIXES[isinstance(data, bytes)]):
+                        continue
+                    message_data = fast_json.loads(data)
                     
                     # Handle initialization
                     if message_data.get("init"):
                         session_id = message_data.get("uuid")
-                        await websocket.send_text(json.dumps({
-                            "status": "connected",
-                            "session_id": session_id
-                        }))
+                        await send(_ACK_PREFIX + fast_json.dumps(session_id) + '}')
                         logger.info(f"WebSocket connected: {session_id}")
                         continue
                     
@@ -313,22 +411,19 @@ class LangGraphAPIWrapper:
                         result = await self.workflow.ainvoke(state)
                         
                         # Send completion signal
-                        await websocket.send_text(json.dumps({
-                            "on_chat_model_end": True,
-                            "metadata": {
-                                "forward_links": result.get("forward_links", []),
-                                "tools_used": result.get("executed_tools", [])
-                            }
-                        }))
+                        await send(_END_PREFIX + fast_json.dumps({
+                            "forward_links": result.get("forward_links", _NO_ITEMS),
+                            "tools_used": result.get("executed_tools", _NO_ITEMS)
+                        }) + '}')
                         
             except WebSocketDisconnect:
                 logger.info(f"WebSocket disconnected: {session_id}")
-                if session_id and session_id in self.active_sessions:
-                    del self.active_sessions[session_id]
+                if session_id:
+                    self.active_sessions.pop(session_id)
             except Exception as e:
                 logger.error(f"WebSocket error: {e}")
                 try:
-                    await websocket.send_text(json.dumps({
+                    await websocket.send_text(fast_json.dumps({
                         "error": "internal_error",
                         "message": str(e)
                     }))
@@ -343,16 +438,20 @@ class LangGraphAPIWrapper:
         @self.app.get("/api/sessions/{session_id}", tags=["Sessions"])
         async def get_session(session_id: str):
             """Get information about a specific session"""
-            if session_id not in self.active_sessions:
+            session = self.active_sessions.get(session_id)
+            if session is None:
                 raise HTTPException(status_code=404, detail="Session not found")
-            return self.active_sessions[session_id]
+            last_activity, message_count = session
+            return {
+                "last_activity": last_activity,
+                "message_count": message_count
+            }
         
         
         @self.app.delete("/api/sessions/{session_id}", tags=["Sessions"])
         async def delete_session(session_id: str):
             """Delete/clear a session"""
-            if session_id in self.active_sessions:
-                del self.active_sessions[session_id]
+            if self.active_sessions.pop(session_id) is not None:
                 return {"status": "deleted", "session_id": session_id}
             raise HTTPException(status_code=404, detail="Session not found")
         
@@ -367,28 +466,7 @@ class LangGraphAPIWrapper:
             Get information about available capabilities and tools.
             Useful for frontend to know what queries are supported.
             """
-            return {
-                "supported_queries": [
-                    "infrastructure (pods, containers, resources)",
-                    "incidents and alerts",
-                    "tickets and service requests",
-                    "changelogs and deployments",
-                    "logs and monitoring"
-                ],
-                "features": [
-                    "streaming_responses",
-                    "multi_tool_orchestration",
-                    "smart_filtering",
-                    "context_aware_responses"
-                ],
-                "available_tools": [
-                    "get_resources", "search_resources",
-                    "get_incidents", "search_incidents",
-                    "get_tickets", "search_tickets",
-                    "get_changelogs", "search_changelogs",
-                    "search_logs", "query_logs"
-                ]
-            }
+            return Response(content=self._capabilities_body, media_type="application/json")
     
     
     def get_app(self) -> FastAPI:
@@ -442,10 +520,13 @@ app = create_api_wrapper(
 if __name__ == "__main__":
     import uvicorn
     
-    # Run the server
+    # Run the server (uvloop + httptools when installed, asyncio + h11 otherwise)
     uvicorn.run(
         app,
         host="0.0.0.0",
         port=8000,
-        log_level="info"
+        log_level="info",
+        loop="auto",
+        http="auto",
+        ws="websockets"
     )
@@ -2,35 +2,84 @@
 Configuration settings for the LangGraph application
 """
 import os
+import tempfile
 from dotenv import load_dotenv
 
 # Load environment variables
 load_dotenv()
 
+
+def _env_bool(key: str, default: str = "false") -> bool:
+    """Environment flag; 1/true/yes/on (any case) count as enabled"""
+    return os.getenv(key, default).strip().lower() in ("1", "true", "yes", "on")
+
+
+def _env_int(key: str, default: int) -> int:
+    return int(os.getenv(key, default))
+
+
+def _env_float(key: str, default: float) -> float:
+    return float(os.getenv(key, default))
+
+
 # OpenAI Configuration
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY", "")
 LLM_MODEL = os.getenv("LLM_MODEL", "gpt-4o")
 
 # MCP Server Configuration
 MCP_SERVER_URL = os.getenv("MCP_SERVER_URL", "http://localhost:3001")
-MCP_SERVER_ENABLED = os.getenv("MCP_SERVER_ENABLED", "true").lower() == "true"
+MCP_SERVER_ENABLED = _env_bool("MCP_SERVER_ENABLED", "true")
 
 # Application Settings
-DEBUG = os.getenv("DEBUG", "false").lower() == "true"
+DEBUG = _env_bool("DEBUG", "false")
 LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
 
 # LangGraph Settings
 LANGGRAPH_CHECKPOINT_ENABLED = True
 LANGGRAPH_THREAD_ID = "default"
+# In-memory checkpointers keep at most this many conversation threads (least recently used evicted)
+LANGGRAPH_CHECKPOINT_MAX_THREADS = _env_int("LANGGRAPH_CHECKPOINT_MAX_THREADS", 2048)
+# Simple chat mode keeps this many recent messages per thread (older ones are dropped from state)
+SIMPLE_CHAT_MAX_MESSAGES = _env_int("SIMPLE_CHAT_MAX_MESSAGES", 40)
 
 # Feature Flags
-USE_ENHANCED_MODE = os.getenv("USE_ENHANCED_MODE", "true").lower() == "true"
-ENABLE_MCP_TOOLS = os.getenv("ENABLE_MCP_TOOLS", "true").lower() == "true"
+USE_ENHANCED_MODE = _env_bool("USE_ENHANCED_MODE", "true")
+ENABLE_MCP_TOOLS = _env_bool("ENABLE_MCP_TOOLS", "true")
 
 # Tool Execution Settings
-MAX_TOOL_RETRIES = int(os.getenv("MAX_TOOL_RETRIES", "3"))
-TOOL_TIMEOUT = int(os.getenv("TOOL_TIMEOUT", "60"))
+MAX_TOOL_RETRIES = _env_int("MAX_TOOL_RETRIES", 3)
+TOOL_TIMEOUT = _env_int("TOOL_TIMEOUT", 60)
+
+# Pooled HTTP connections to the MCP server (shared by all MCP clients)
+MCP_HTTP_MAX_CONNECTIONS = _env_int("MCP_HTTP_MAX_CONNECTIONS", 200)
+MCP_HTTP_KEEPALIVE_S = _env_float("MCP_HTTP_KEEPALIVE_S", 30)
 
 # LLM Settings
-LLM_TEMPERATURE = float(os.getenv("LLM_TEMPERATURE", "0.0"))
-LLM_MAX_TOKENS = int(os.getenv("LLM_MAX_TOKENS", "2000"))
+# Pooled HTTP connections shared by all OpenAI clients
+OPENAI_HTTP_MAX_CONNECTIONS = _env_int("OPENAI_HTTP_MAX_CONNECTIONS", 200)
+OPENAI_HTTP_MAX_KEEPALIVE = _env_int("OPENAI_HTTP_MAX_KEEPALIVE", 50)
+OPENAI_HTTP_TIMEOUT_S = _env_float("OPENAI_HTTP_TIMEOUT_S", 600)
+LLM_TEMPERATURE = _env_float("LLM_TEMPERATURE", 0.0)
+LLM_MAX_TOKENS = _env_int("LLM_MAX_TOKENS", 2000)
+
+# Streamed tokens are coalesced into one websocket frame per this many tokens/bytes or wait window
+STREAM_COALESCE_MAX_TOKENS = _env_int("STREAM_COALESCE_MAX_TOKENS", 16)
+STREAM_COALESCE_MAX_BYTES = _env_int("STREAM_COALESCE_MAX_BYTES", 512)
+STREAM_COALESCE_MAX_WAIT_MS = _env_float("STREAM_COALESCE_MAX_WAIT_MS", 15)
+
+# Semantic response cache: first-turn queries whose embedding is this similar to a recent
+# query replay that query's response instead of running the LLM (off by default)
+SEMANTIC_CACHE_ENABLED = _env_bool("SEMANTIC_CACHE_ENABLED", "false")
+SEMANTIC_CACHE_THRESHOLD = _env_float("SEMANTIC_CACHE_THRESHOLD", 0.92)
+SEMANTIC_CACHE_TTL = _env_float("SEMANTIC_CACHE_TTL", 300)
+SEMANTIC_CACHE_MAX_ENTRIES = _env_int("SEMANTIC_CACHE_MAX_ENTRIES", 512)
+SEMANTIC_CACHE_EMBEDDING_MODEL = os.getenv("SEMANTIC_CACHE_EMBEDDING_MODEL", "text-embedding-3-small")
+SEMANTIC_CACHE_DIMENSIONS = _env_int("SEMANTIC_CACHE_DIMENSIONS", 256)
+
+# Query Analysis Cache (persisted across restarts; set the path to "" to disable)
+QUERY_ANALYSIS_CACHE_PATH = os.getenv(
+    "QUERY_ANALYSIS_CACHE_PATH",
+    os.path.join(tempfile.gettempdir(), "langgraph_query_analysis.sqlite3")
+)
+QUERY_ANALYSIS_CACHE_TTL = _env_int("QUERY_ANALYSIS_CACHE_TTL", 86400)
+QUERY_ANALYSIS_CACHE_MAX_ENTRIES = _env_int("QUERY_ANALYSIS_CACHE_MAX_ENTRIES", 5000)
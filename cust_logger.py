@@ -1,7 +1,6 @@
 import inspect
 import logging
 from colorama import Fore, Style, init
-from datetime import datetime
 
 init(autoreset=True)  # Automatically reset color formatting after each log
                       # Allowing different logs to have different colors
@@ -17,18 +16,19 @@ class ColorFormatter(logging.Formatter):
     }
     FILE_COLOR = Fore.CYAN + Style.BRIGHT  # Filename and line number in bright cyan
     MESSAGE_COLOR_BY_FILE = {}  # Custom color per file, which gets added to by helper function
+    default_msec_format = '%s.%03d'  # asctime as YYYY-MM-DD HH:MM:SS.mmm
 
     def format(self, record):
         log_color = self.COLORS.get(record.levelno, Style.RESET_ALL) # Style.RESET_ALL resets foreground, background, and brightness.
         levelname = f"{log_color}{record.levelname}{Style.RESET_ALL}"
         filename_lineno = f"{self.FILE_COLOR}{record.filename}:{record.lineno:<5}{Style.RESET_ALL}" # <{#} is num spacing
         message_color = self.MESSAGE_COLOR_BY_FILE.get(record.filename, Style.RESET_ALL)
-        colored_message = f"{message_color}{record.msg}{Style.RESET_ALL}"
-        record.timestamp = datetime.now().isoformat()  # Add timestamp to logs
-        log_output = f"{levelname}:     {filename_lineno} - {colored_message}"
+        colored_message = f"{message_color}{record.getMessage()}{Style.RESET_ALL}"  # getMessage() applies %-style args
+        timestamp = self.formatTime(record)  # Uses record.created, so no extra clock read per log
+        log_output = f"{timestamp} {levelname}:     {filename_lineno} - {colored_message}"
         return log_output
 
-color_formatter = ColorFormatter('%(levelname)s: %(filename_lineno)s - %(message)s')
+color_formatter = ColorFormatter('%(asctime)s %(levelname)s: %(filename_lineno)s - %(message)s')
 handler = logging.StreamHandler()  # Console logging handler
 handler.setFormatter(color_formatter)  # Set our handler to our custom formatter above
 logger = logging.getLogger()
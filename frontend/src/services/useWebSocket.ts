@@ -31,26 +31,35 @@ export const useWebSocket = (url: string, setEE: (value: boolean) => void) => {
             }
         };
 
+        const handleMessage = (data: any) => {
+            if (data.on_tool_call) {
+                setToolCalls(data.on_tool_call.tools || []); // Set current tool calls
+            }
+
+            if (data.on_chat_model_stream) {
+                setResponse((prevResponse) => prevResponse + data.on_chat_model_stream); // Streamed response handling
+                setToolCalls([]); // Clear tool calls when response starts
+            }
+
+            if (data.on_chat_model_end) {
+                setIsBotResponseComplete(true); // Bot streaming is done, message complete
+            }
+
+            if (data.on_easter_egg) {
+                setEE(true); // Easter egg trigger
+            }
+        };
+
         socket.onmessage = (event) => {
             try {
                 const data = JSON.parse(event.data);
                 console.log('Received from server:', data);
 
-                if (data.on_tool_call) {
-                    setToolCalls(data.on_tool_call.tools || []); // Set current tool calls
-                }
-
-                if (data.on_chat_model_stream) {
-                    setResponse((prevResponse) => prevResponse + data.on_chat_model_stream); // Streamed response handling
-                    setToolCalls([]); // Clear tool calls when response starts
-                }
-
-                if (data.on_chat_model_end) {
-                    setIsBotResponseComplete(true); // Bot streaming is done, message complete
-                }
-
-                if (data.on_easter_egg) {
-                    setEE(true); // Easter egg trigger
+                // The server may batch several messages into one frame as a JSON array
+                if (Array.isArray(data)) {
+                    data.forEach(handleMessage);
+                } else {
+                    handleMessage(data);
                 }
             } catch (error) {
                 console.log('Error parsing WebSocket message:', error);
@@ -1,22 +1,34 @@
 # Enhanced LangGraph with MCP tool integration and intelligent orchestration
-import sys, os
+import sys, os, re
+import json
+import logging
+import traceback
+from types import MappingProxyType
 from typing import Annotated, TypedDict
 import asyncio
 
 from dotenv import load_dotenv
-from langchain_openai import ChatOpenAI
+from fastapi import WebSocket
+from langchain_openai import ChatOpenAI, OpenAIEmbeddings
 
 from langchain_core.callbacks import adispatch_custom_event
+from langchain_core.messages import AIMessage, HumanMessage
 from langchain_core.runnables.config import RunnableConfig
 from langgraph.graph import START, END, StateGraph
 from langgraph.graph.message import AnyMessage, add_messages
-from langgraph.checkpoint.memory import MemorySaver
 
 from cust_logger import logger, set_files_message_color
 
 # Import enhanced workflow components
 from workflow import EnhancedLangGraphWorkflow
 from utils.mcp_client import MCPClientManager
+from utils.bounded_memory_saver import BoundedMemorySaver
+from utils.llm_client import llm_client
+from utils.token_coalescer import TokenCoalescer
+from utils.websocket_sender import QueuedWebSocketSender
+from utils.semantic_cache import SemanticCache
+from utils import openai_http
+from utils import fast_json
 import config
 
 set_files_message_color('MAGENTA')  # Set color for logging in this function
@@ -39,6 +51,8 @@ try:
         max_tokens=None,
         timeout=None,
         max_retries=2,
+        http_client=openai_http.http_client,  # _call_model invokes synchronously
+        http_async_client=openai_http.async_http_client,
     )
 except Exception as e:
     logger.fatal(f"Fatal Error: Failed to initialize model: {e}")
@@ -54,16 +68,26 @@ enhanced_workflow = EnhancedLangGraphWorkflow(
 )
 
 # Keep original simple graph for backward compatibility (easter egg feature)
+def _add_messages_capped(left, right):
+    """add_messages, keeping only the most recent SIMPLE_CHAT_MAX_MESSAGES per thread"""
+    merged = add_messages(left, right)
+    if len(merged) > config.SIMPLE_CHAT_MAX_MESSAGES:
+        merged = merged[-config.SIMPLE_CHAT_MAX_MESSAGES:]
+    return merged
+
 class GraphsState(TypedDict):
-    messages: Annotated[list[AnyMessage], add_messages]
+    messages: Annotated[list[AnyMessage], _add_messages_capped]
 
 graph = StateGraph(GraphsState)
 
+# One case-insensitive scan instead of checking each spelling of the keywords
+_EASTER_EGG_RE = re.compile(r"lang(?:chain|graph)", re.IGNORECASE)
+
 async def conditional_check(state: GraphsState, config: RunnableConfig):
     messages = state["messages"]
     msg = messages[-1].content
-    keywords = ["LangChain", "langchain", "Langchain", "LangGraph", "Langgraph", "langgraph"]
-    if any(keyword in msg for keyword in keywords):
+    # Content can be a list of parts for multimodal messages
+    if isinstance(msg, str) and _EASTER_EGG_RE.search(msg):
         await adispatch_custom_event("on_easter_egg", True, config=config)
     pass
 
@@ -78,14 +102,37 @@ graph.add_edge(START, "conditional_check")
 graph.add_edge("conditional_check", "modelNode")
 graph.add_edge("modelNode", END)
 
-memory = MemorySaver()
+memory = BoundedMemorySaver(maxsize=config.LANGGRAPH_CHECKPOINT_MAX_THREADS)
 graph_runnable = graph.compile(checkpointer=memory)
 
+# Near-duplicate first-turn queries replay a recent response (see config.SEMANTIC_CACHE_*)
+semantic_cache = None
+if config.SEMANTIC_CACHE_ENABLED:
+    _embeddings = OpenAIEmbeddings(
+        model=config.SEMANTIC_CACHE_EMBEDDING_MODEL,
+        dimensions=config.SEMANTIC_CACHE_DIMENSIONS,
+        http_client=openai_http.http_client,
+        http_async_client=openai_http.async_http_client
+    )
+    semantic_cache = SemanticCache(
+        _embeddings.aembed_query,
+        threshold=config.SEMANTIC_CACHE_THRESHOLD,
+        ttl=config.SEMANTIC_CACHE_TTL,
+        maxsize=config.SEMANTIC_CACHE_MAX_ENTRIES
+    )
+
 # ===========================================================================================================
 # Enhanced invoke function that supports both simple chat and MCP tool orchestration
-import json
-from datetime import datetime
-from fastapi import WebSocket
+
+# Shared read-only defaults for missing result sections; _EMPTY_DICT is for values that get serialized
+_EMPTY_MAPPING = MappingProxyType({})
+_EMPTY_DICT: dict = {}
+
+# Strong references to fire-and-forget tasks until they finish
+_background_tasks: set = set()
+
+# Constant frames are serialized once
+_END_MSG = fast_json.dumps({"on_chat_model_end": True})
 
 async def invoke_our_graph(websocket: WebSocket, data: str, user_uuid: str, use_enhanced: bool = False):
     """
@@ -98,97 +145,178 @@ async def invoke_our_graph(websocket: WebSocket, data: str, user_uuid: str, use_
         use_enhanced: If True, use enhanced workflow with MCP tools
     """
     
+    # Layer 0: Semantic cache - only for the first turn of a conversation, since later
+    # answers depend on the thread's history. The easter egg path always runs the graph.
+    cacheable = (
+        semantic_cache is not None
+        and not _EASTER_EGG_RE.search(data)
+        and not await _has_history(user_uuid)
+    )
+    if cacheable:
+        cached = await semantic_cache.lookup(data, accept=_enhanced_only if use_enhanced else None)
+        if cached is not None:
+            await _replay_cached_response(websocket, data, user_uuid, cached)
+            return
+    
     # Layer 1: Semantic Router - Use LLM to decide if query needs tools
     # This replaces brittle keyword matching with intelligent semantic understanding
     # Benefits:
     # - Handles variations: "kaput", "stuck", "wonky" vs hardcoded "failed", "error"
     # - Context-aware: "python" (language?) vs "python pod" (infrastructure)
     # - Flexible: No need to maintain massive keyword lists
-    from utils.llm_client import llm_client
-    
     if use_enhanced:
         # Manually forced to use enhanced mode
         use_enhanced_mode = True
         logger.info(f"🎯 Enhanced mode manually enabled for: {data[:50]}...")
     else:
-        # Ask the LLM Router to decide based on semantic understanding
+        # Ask the LLM Router to decide based on semantic understanding, loading the MCP tool
+        # list meanwhile so an enhanced query doesn't wait for it after routing
         logger.info(f"🚦 Routing query through semantic LLM router...")
+        # (not awaited - a simple-mode reply shouldn't wait on the MCP server)
+        prefetch = asyncio.create_task(enhanced_workflow.prefetch_tools())
+        _background_tasks.add(prefetch)
+        prefetch.add_done_callback(_background_tasks.discard)
         use_enhanced_mode = await llm_client.should_use_tools(data)
     
     if use_enhanced_mode:
         # Use enhanced workflow with MCP tools
-        try:
-            logger.info(f"🚀 Using enhanced workflow for: {data[:50]}...")
-            
-            # Process through enhanced workflow with websocket for streaming
-            result = await enhanced_workflow.process_query(data, user_uuid, websocket=websocket)
-            
-            # Send the enriched response metadata (streaming already happened during LLM generation)
-            response_message = {
-                "on_enhanced_response": {
-                    "response": result.get("response", ""),
-                    "query_analysis": result.get("query_analysis", {}),
-                    "execution_summary": result.get("execution_summary", {}),
-                    "forward_links": result.get("enrichment", {}).get("forward_links", []),
-                    "recommendations": result.get("enrichment", {}).get("recommendations", [])
-                }
-            }
-            
-            # Note: Streaming already happened in real-time during LLM generation
-            # No need for post-processing word chunks anymore
-            
-            # Send completion with metadata (check if websocket is still open)
+        # Frames are sent by a background task so tool-call notices and streamed tokens
+        # don't make the workflow wait on socket I/O
+        sender = QueuedWebSocketSender(websocket)
+        result = None
+        async with asyncio.TaskGroup() as tg:
+            tg.create_task(sender.run())
             try:
-                await websocket.send_text(json.dumps(response_message))
-                await websocket.send_text(json.dumps({"on_chat_model_end": True}))
+                logger.info(f"🚀 Using enhanced workflow for: {data[:50]}...")
                 
+                # Process through enhanced workflow with websocket for streaming
+                result = await enhanced_workflow.process_query(data, user_uuid, websocket=sender)
+                
+                # Send the enriched response metadata (streaming already happened during LLM generation)
+                enrichment = result.get("enrichment") or _EMPTY_MAPPING
+                response_message = {
+                    "on_enhanced_response": {
+                        "response": result.get("response", ""),
+                        "query_analysis": result.get("query_analysis") or _EMPTY_DICT,
+                        "execution_summary": result.get("execution_summary") or _EMPTY_DICT,
+                        "forward_links": enrichment.get("forward_links", ()),
+                        "recommendations": enrichment.get("recommendations", ())
+                    }
+                }
+                
+                # Note: Streaming already happened in real-time during LLM generation
+                # No need for post-processing word chunks anymore
+                
+                # Queue completion with metadata; the end signal is the last frame sent
+                await sender.send_text(fast_json.dumps(response_message))
+                await sender.send_text(_END_MSG)
+                
+            except Exception as e:
+                result = None
+                logger.error(f"❌ Enhanced workflow error: {e}")
+                logger.error(f"❌ Traceback: {traceback.format_exc()}")
+                # Try to send error if websocket still open
+                await sender.send_text(fast_json.dumps({"error": str(e)}))
+            finally:
+                sender.close()
+        
+        if sender.error is not None:
+            # WebSocket already closed - just log it, don't fail the whole request
+            logger.warning(f"⚠️ WebSocket already closed when trying to send completion: {sender.error}")
+        elif result is not None:
+            if logger.isEnabledFor(logging.INFO):
                 logger.info(json.dumps({
-                    "timestamp": datetime.now().isoformat(),
                     "uuid": user_uuid,
                     "llm_method": "enhanced_workflow",
                     "sent": result.get("response", "")[:100]
                 }))
-            except Exception as ws_error:
-                # WebSocket already closed - just log it, don't fail the whole request
-                logger.warning(f"⚠️ WebSocket already closed when trying to send completion: {ws_error}")
-            
-        except Exception as e:
-            import traceback
-            logger.error(f"❌ Enhanced workflow error: {e}")
-            logger.error(f"❌ Traceback: {traceback.format_exc()}")
-            # Try to send error if websocket still open
-            try:
-                await websocket.send_text(json.dumps({"error": str(e)}))
-            except:
-                pass
+            if cacheable and result.get("success"):
+                await semantic_cache.store(data, {
+                    "mode": "enhanced",
+                    "response": result.get("response", ""),
+                    "response_frame": fast_json.dumps(response_message)
+                })
     else:
         # Use simple chat mode
-        await invoke_simple_mode(websocket, data, user_uuid)
+        await invoke_simple_mode(websocket, data, user_uuid, cache_response=cacheable)
 
 
-async def invoke_simple_mode(websocket: WebSocket, data: str, user_uuid: str):
+async def invoke_simple_mode(websocket: WebSocket, data: str, user_uuid: str, cache_response: bool = False):
     """Original simple chat mode"""
     initial_input = {"messages": data}
     thread_config = {"configurable": {"thread_id": user_uuid}}
-    final_text = ""
+    parts: list[str] = []  # Joined only when the response is logged
+    streamed = 0
+    stream = TokenCoalescer(
+        websocket,
+        max_tokens=config.STREAM_COALESCE_MAX_TOKENS,
+        max_bytes=config.STREAM_COALESCE_MAX_BYTES,
+        max_wait_ms=config.STREAM_COALESCE_MAX_WAIT_MS
+    )
 
     async for event in graph_runnable.astream_events(initial_input, thread_config, version="v2"):
         kind = event["event"]
 
         if kind == "on_chat_model_stream":
             addition = event["data"]["chunk"].content
-            final_text += addition
             if addition:
-                message = json.dumps({"on_chat_model_stream": addition})
-                await websocket.send_text(message)
+                parts.append(addition)
+                await stream.push(addition)
+                streamed += 1
+                # A burst of queued tokens is consumed without ever suspending (buffered pushes
+                # and sends into a non-full socket don't block), so yield to other connections
+                if not streamed & 31:
+                    await asyncio.sleep(0)
 
         elif kind == "on_chat_model_end":
-            message = json.dumps({"on_chat_model_end": True})
-            logger.info(json.dumps({"timestamp": datetime.now().isoformat(), "uuid": user_uuid, "llm_method": kind, "sent": final_text}))
-            await websocket.send_text(message)
+            await stream.flush()
+            if logger.isEnabledFor(logging.INFO):
+                final_text = "".join(parts)
+                logger.info(json.dumps({"uuid": user_uuid, "llm_method": kind, "sent": final_text}))
+            await websocket.send_text(_END_MSG)
 
         elif kind == "on_custom_event":
-            message = json.dumps({event["name"]: event["data"]})
-            logger.info(json.dumps({"timestamp": datetime.now().isoformat(), "uuid": user_uuid, "llm_method": kind, "sent": message}))
+            await stream.flush()
+            message = fast_json.dumps({event["name"]: event["data"]})
+            if logger.isEnabledFor(logging.INFO):
+                logger.info(json.dumps({"uuid": user_uuid, "llm_method": kind, "sent": message}))
             await websocket.send_text(message)
 
+    await stream.flush()
+    
+    if cache_response and parts:
+        await semantic_cache.store(data, {"mode": "simple", "response": "".join(parts), "response_frame": None})
+
+
+def _enhanced_only(cached: dict) -> bool:
+    return cached["mode"] == "enhanced"
+
+
+async def _has_history(user_uuid: str) -> bool:
+    """True if either mode already has checkpoints for this conversation"""
+    thread_config = {"configurable": {"thread_id": user_uuid}}
+    return await memory.aget_tuple(thread_config) is not None or await enhanced_workflow.has_history(user_uuid)
+
+
+async def _replay_cached_response(websocket: WebSocket, data: str, user_uuid: str, cached: dict):
+    """Stream a cached response like a live one, then record the turn in the conversation history"""
+    text = cached["response"]
+    chunk_size = max(1, config.STREAM_COALESCE_MAX_BYTES)
+    for start in range(0, len(text), chunk_size):
+        await websocket.send_text(fast_json.dumps({"on_chat_model_stream": text[start:start + chunk_size]}))
+    if cached["response_frame"] is not None:
+        await websocket.send_text(cached["response_frame"])
+    await websocket.send_text(_END_MSG)
+    
+    if logger.isEnabledFor(logging.INFO):
+        logger.info(json.dumps({"uuid": user_uuid, "llm_method": "semantic_cache", "sent": text[:100]}))
+    
+    # Follow-up questions should see this turn, as if the graph had answered it
+    if cached["mode"] == "enhanced":
+        await enhanced_workflow.record_exchange(user_uuid, data, text)
+    else:
+        await graph_runnable.aupdate_state(
+            {"configurable": {"thread_id": user_uuid}},
+            {"messages": [HumanMessage(content=data), AIMessage(content=text)]},
+            as_node="modelNode"
+        )
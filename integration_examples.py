@@ -212,9 +212,7 @@ class LangGraphWebSocketClient {
                 }));
             };
 
-            this.ws.onmessage = (event) => {
-                const data = JSON.parse(event.data);
-
+            const handleMessage = (data: any) => {
                 // Handle connection confirmation
                 if (data.status === 'connected') {
                     console.log('Connected:', data.session_id);
@@ -234,6 +232,17 @@ class LangGraphWebSocketClient {
                 }
             };
 
+            this.ws.onmessage = (event) => {
+                const data = JSON.parse(event.data);
+
+                // The server may batch several messages into one frame as a JSON array
+                if (Array.isArray(data)) {
+                    data.forEach(handleMessage);
+                } else {
+                    handleMessage(data);
+                }
+            };
+
             this.ws.onerror = (error) => {
                 console.error('WebSocket error:', error);
                 reject(error);
@@ -349,9 +358,7 @@ export const useLangGraphChat = (wsUrl: string = 'ws://localhost:8000/ws') => {
             }));
         };
 
-        ws.onmessage = (event) => {
-            const data = JSON.parse(event.data);
-
+        const handleMessage = (data: any) => {
             if (data.status === 'connected') {
                 setIsConnected(true);
                 return;
@@ -381,6 +388,17 @@ export const useLangGraphChat = (wsUrl: string = 'ws://localhost:8000/ws') => {
             }
         };
 
+        ws.onmessage = (event) => {
+            const data = JSON.parse(event.data);
+
+            // The server may batch several messages into one frame as a JSON array
+            if (Array.isArray(data)) {
+                data.forEach(handleMessage);
+            } else {
+                handleMessage(data);
+            }
+        };
+
         ws.onerror = (error) => {
             console.error('WebSocket error:', error);
             setIsConnected(false);
@@ -5,7 +5,7 @@ Orchestrator Agent - Validation and Initialization
 import logging
 from typing import Dict, Any
 from datetime import datetime
-from state import ChatState, update_state_context
+from state import ChatState
 
 logger = logging.getLogger(__name__)
 
@@ -15,6 +15,8 @@ class OrchestratorAgent:
     Orchestrator agent responsible for initial validation and setup
     """
     
+    REQUIRED_FIELDS = ("user_query", "session_id", "request_id")
+    
     def __init__(self):
         self.name = "OrchestratorAgent"
         self.version = "1.0.0"
@@ -26,9 +28,10 @@ class OrchestratorAgent:
             "maximum_query_length": 1000
         }
     
-    async def orchestrate_workflow(self, state: ChatState) -> ChatState:
+    async def orchestrate_workflow(self, state: ChatState) -> Dict[str, Any]:
         """
-        Orchestrator validation and initialization
+        Orchestrator validation and initialization.
+        Returns only the state keys to update.
         """
         session_id = state["session_id"]
         
@@ -43,17 +46,18 @@ class OrchestratorAgent:
             if not validation_result["valid"]:
                 return self._handle_validation_failure(state, validation_result)
             
-            # Update state with orchestrator metadata
-            state = update_state_context(state, "orchestrator_validation", {
-                "validated_at": datetime.now().isoformat(),
-                "validation_result": validation_result,
-                "orchestrator_version": self.version
-            })
-            
-            state = {**state, "workflow_status": "running", "current_agent": "orchestrator"}
+            # Return only the keys we change - LangGraph merges node updates into the state
+            context_data = {
+                **state.get("context_data", {}),
+                "orchestrator_validation": {
+                    "validated_at": datetime.now().isoformat(),
+                    "validation_result": validation_result,
+                    "orchestrator_version": self.version
+                }
+            }
             
             logger.info("✅ Orchestrator validation passed")
-            return state
+            return {"context_data": context_data, "workflow_status": "running", "current_agent": "orchestrator"}
             
         except Exception as e:
             logger.error(f"❌ Orchestrator validation error: {str(e)}")
@@ -62,49 +66,37 @@ class OrchestratorAgent:
     async def _validate_initial_state(self, state: ChatState) -> Dict[str, Any]:
         """Validate that the initial state is ready for processing"""
         
-        validation_results = {
-            "valid": True,
-            "errors": [],
-            "warnings": []
-        }
-        
         # Check required fields
-        required_fields = ["user_query", "session_id", "request_id"]
-        for field in required_fields:
-            if not state.get(field):
-                validation_results["errors"].append(f"Missing required field: {field}")
-                validation_results["valid"] = False
+        errors = [f"Missing required field: {field}" for field in self.REQUIRED_FIELDS if not state.get(field)]
+        warnings = []
         
         # Validate user query
-        user_query = state.get("user_query", "")
-        if len(user_query) < self.quality_thresholds["minimum_query_length"]:
-            validation_results["errors"].append(
-                f"Query too short (minimum {self.quality_thresholds['minimum_query_length']} characters)"
-            )
-            validation_results["valid"] = False
+        query_length = len(state.get("user_query") or "")
+        minimum_length = self.quality_thresholds["minimum_query_length"]
+        if query_length < minimum_length:
+            errors.append(f"Query too short (minimum {minimum_length} characters)")
+        elif query_length > self.quality_thresholds["maximum_query_length"]:
+            warnings.append(f"Query very long ({query_length} characters)")
         
-        if len(user_query) > self.quality_thresholds["maximum_query_length"]:
-            validation_results["warnings"].append(
-                f"Query very long ({len(user_query)} characters)"
-            )
-        
-        return validation_results
+        return {
+            "valid": not errors,
+            "errors": errors,
+            "warnings": warnings
+        }
     
-    def _handle_validation_failure(self, state: ChatState, validation_result: Dict[str, Any]) -> ChatState:
+    def _handle_validation_failure(self, state: ChatState, validation_result: Dict[str, Any]) -> Dict[str, Any]:
         """Handle initial state validation failure"""
         logger.error(f"❌ State validation failed: {validation_result['errors']}")
         
         return {
-            **state,
             "workflow_status": "failed",
             "error_count": len(validation_result["errors"]),
             "final_response": f"Request validation failed: {', '.join(validation_result['errors'])}"
         }
     
-    def _handle_workflow_failure(self, state: ChatState, error: Exception) -> ChatState:
+    def _handle_workflow_failure(self, state: ChatState, error: Exception) -> Dict[str, Any]:
         """Handle unexpected workflow failure"""
         return {
-            **state,
             "workflow_status": "failed",
             "error_count": state.get("error_count", 0) + 1,
             "final_response": f"Workflow failed: {str(error)}"
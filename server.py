@@ -1,14 +1,23 @@
 import json
+import logging
 import os
+from contextlib import asynccontextmanager
 from fastapi import FastAPI, WebSocket
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.staticfiles import StaticFiles
 from fastapi.responses import FileResponse
-from graph import invoke_our_graph
-from datetime import datetime
+from graph import invoke_our_graph, enhanced_workflow
+from utils import openai_http
 from cust_logger import logger, set_files_message_color
 
-app = FastAPI()
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    yield
+    # Close the MCP client's and OpenAI clients' pooled HTTP connections on shutdown
+    await enhanced_workflow.aclose()
+    await openai_http.aclose()
+
+app = FastAPI(lifespan=lifespan)
 
 # Add CORS middleware to allow frontend on port 3000 to connect
 app.add_middleware(
@@ -41,16 +50,17 @@ async def serve_frontend(full_path: str):
 # WebSocket endpoint for real-time communication with the frontend
 @app.websocket("/ws")
 async def websocket_endpoint(websocket: WebSocket):
-    # unless described (error) logging is in {"timestamp": "YYYY-MM-DDTHH:MM:SS.MS", "uuid": "", "op": ""} format,
-    # {timestamp, designated uuid, and what operation was done}
+    # unless described (error) logging is in {"uuid": "", "op": ""} format,
+    # {designated uuid, and what operation was done}; the log formatter adds the timestamp
 
     await websocket.accept()  # Accept ANY WebSocket connection
     user_uuid = None  # Placeholder for the conversation UUID
     try:
         while True:
             data = await websocket.receive_text()  # Receive message from client
-            # Log the received data in {"timestamp": "YYYY-MM-DDTHH:MM:SS.MS", "uuid": "", "received": {"uuid": "", "init": bool}} format
-            logger.info(json.dumps({"timestamp": datetime.now().isoformat(), "uuid": user_uuid, "received": json.loads(data)}))
+            # Log the received data in {"uuid": "", "received": {"uuid": "", "init": bool}} format
+            if logger.isEnabledFor(logging.INFO):
+                logger.info(json.dumps({"uuid": user_uuid, "received": json.loads(data)}))
 
             try:
                 # parse the data extracting the UUID and Message and if its the first message of the conversation
@@ -61,27 +71,30 @@ async def websocket_endpoint(websocket: WebSocket):
 
                 # If it's the first message, log the conversation initialization process
                 if init:
-                    logger.info(json.dumps({"timestamp": datetime.now().isoformat(), "uuid": user_uuid, "op": "Initializing ws with client."}))
+                    if logger.isEnabledFor(logging.INFO):
+                        logger.info(json.dumps({"uuid": user_uuid, "op": "Initializing ws with client."}))
                 else:
                     if message:
                         # If a message is provided, invoke the LangGraph, websocket for send, user message, and passing conversation ID
                         await invoke_our_graph(websocket, message, user_uuid)
             except json.JSONDecodeError as e:
-                logger.error(json.dumps({"timestamp": datetime.now().isoformat(), "uuid": user_uuid, "op": f"JSON encoding error - {e}"}))
+                logger.error(json.dumps({"uuid": user_uuid, "op": f"JSON encoding error - {e}"}))
     except Exception as e:
         # Catch all other unexpected exceptions and log the error
-        logger.error(json.dumps({"timestamp": datetime.now().isoformat(), "uuid": user_uuid, "op": f"Error: {e}"}))
+        logger.error(json.dumps({"uuid": user_uuid, "op": f"Error: {e}"}))
     finally:
         # before the connection is closed, check if its already closed from the client side before trying to close from our side
-        if user_uuid:
-            logger.info(json.dumps({"timestamp": datetime.now().isoformat(), "uuid": user_uuid, "op": "Closing connection."}))
+        if user_uuid and logger.isEnabledFor(logging.INFO):
+            logger.info(json.dumps({"uuid": user_uuid, "op": "Closing connection."}))
         try:
             await websocket.close()
         except RuntimeError as e:
             # uncaught connection was already closed error
-            logger.error(json.dumps({"timestamp": datetime.now().isoformat(), "uuid": user_uuid, "op": f"WebSocket close error: {e}"}))
+            logger.error(json.dumps({"uuid": user_uuid, "op": f"WebSocket close error: {e}"}))
 
 # Main entry point for running the FastAPI app using Uvicorn
 if __name__ == "__main__":
     import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000, log_level="warning")
+    # loop/http "auto" pick uvloop and httptools when installed (see requirements.txt),
+    # falling back to asyncio and h11 where they aren't available (e.g. uvloop on Windows)
+    uvicorn.run(app, host="0.0.0.0", port=8000, log_level="warning", loop="auto", http="auto", ws="websockets")
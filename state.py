@@ -2,8 +2,9 @@
 State management for LangGraph workflow with MCP tool integration
 """
 
-import uuid
-from typing import TypedDict, Optional, Dict, Any, List
+from uuid import uuid4
+from dataclasses import dataclass
+from typing import TypedDict, NamedTuple, Optional, Dict, Any, Iterable, List, Tuple
 from datetime import datetime
 
 
@@ -70,22 +71,83 @@ class ChatState(TypedDict):
     needs_comprehensive_followup: bool
     extracted_ids: Dict[str, Any]
     followup_tool_plan: List[Dict[str, Any]]
+    followup_parallelism: Optional[Dict[str, Any]]  # {"mode": "gather", "max_concurrent": int}
+    followup_budget: Optional[Dict[str, Any]]  # Linked-entity fan-out chosen under the cost budget
     
-    completion_timestamp: Optional[str]
+    completion_timestamp: Optional[float]  # time.time() when the workflow finished
     multi_query_summary: Optional[Dict[str, Any]]
 
 
+@dataclass(frozen=True, slots=True)
+class QueryAnalysisView:
+    """Read-only view of the LLM query analysis stored at context_data.query_analysis.llm_analysis"""
+    
+    is_comprehensive: bool = False
+    scope: str = ""
+    intent: str = ""  # lowercased
+    is_multi_entity: bool = False
+    
+    @classmethod
+    def from_state(cls, state: ChatState) -> "QueryAnalysisView":
+        """Resolve the nested analysis dict once and pull out the fields agents branch on"""
+        llm_analysis = ((state.get("context_data") or {}).get("query_analysis") or {}).get("llm_analysis") or {}
+        return cls(
+            is_comprehensive=bool(llm_analysis.get("comprehensive", False)),
+            scope=llm_analysis.get("scope") or "",
+            intent=(llm_analysis.get("intent") or "").lower(),
+            is_multi_entity=bool(llm_analysis.get("multi_entity", False))
+        )
+
+
+class ExtractedIds(NamedTuple):
+    """IDs pulled from search results to drive comprehensive follow-up queries"""
+    
+    resource_id: Optional[Any] = None
+    resource_name: Optional[str] = None
+    incident_id: Optional[Any] = None
+    incident_title: Optional[str] = None
+    ticket_id: Optional[Any] = None
+    linked_resource_ids: Tuple[Any, ...] = ()
+    linked_incident_ids: Tuple[Any, ...] = ()
+    
+    def has_ids(self) -> bool:
+        """True if any field was extracted"""
+        return any(value is not None and value != () for value in self)
+    
+    def to_state(self) -> Dict[str, Any]:
+        """Sparse plain dict for ChatState.extracted_ids - checkpoints only serialize builtin types"""
+        return {
+            key: list(value) if isinstance(value, tuple) else value
+            for key, value in self._asdict().items()
+            if value is not None and value != ()
+        }
+    
+    @classmethod
+    def from_state(cls, data: Optional[Dict[str, Any]]) -> "ExtractedIds":
+        """Rebuild from the dict stored in ChatState.extracted_ids"""
+        data = data or {}
+        return cls(
+            resource_id=data.get("resource_id"),
+            resource_name=data.get("resource_name"),
+            incident_id=data.get("incident_id"),
+            incident_title=data.get("incident_title"),
+            ticket_id=data.get("ticket_id"),
+            linked_resource_ids=tuple(data.get("linked_resource_ids") or ()),
+            linked_incident_ids=tuple(data.get("linked_incident_ids") or ())
+        )
+
+
 def create_initial_state(user_query: str, session_id: Optional[str] = None) -> ChatState:
     """Create initial state for a new chat request"""
     
     if not session_id:
-        session_id = str(uuid.uuid4())
+        session_id = uuid4().hex
     
     return {
         # Request metadata
         "user_query": user_query,
         "session_id": session_id,
-        "request_id": str(uuid.uuid4()),
+        "request_id": uuid4().hex,
         "timestamp": datetime.now().isoformat(),
         
         # Query analysis
@@ -142,6 +204,8 @@ def create_initial_state(user_query: str, session_id: Optional[str] = None) -> C
         "needs_comprehensive_followup": False,
         "extracted_ids": {},
         "followup_tool_plan": [],
+        "followup_parallelism": None,
+        "followup_budget": None,
         
         "completion_timestamp": None,
         "multi_query_summary": None
@@ -159,31 +223,59 @@ def update_state_context(state: ChatState, key: str, value: Any) -> ChatState:
 
 def add_mcp_result(state: ChatState, tool_name: str, result: Any, agent_name: str) -> ChatState:
     """Add MCP tool result to state"""
+    return add_mcp_results(state, [(tool_name, result)], agent_name)
+
+
+def add_mcp_results(state: ChatState, tool_results: Iterable[Tuple[str, Any]], agent_name: str) -> ChatState:
+    """Add a batch of (tool_name, result) pairs to state with a single state copy"""
     updated_state = state.copy()
+    timestamp = datetime.now().isoformat()
     
-    mcp_result = {
-        "tool_name": tool_name,
-        "result": result,
-        "success": result.get("success", False) if isinstance(result, dict) else True,
-        "timestamp": datetime.now().isoformat(),
-        "agent": agent_name
-    }
-    
-    if "mcp_results" not in updated_state or updated_state["mcp_results"] is None:
-        updated_state["mcp_results"] = []
+    # Fresh lists so the incoming state's lists are never mutated
+    mcp_results = list(updated_state.get("mcp_results") or [])
+    executed_tools = list(updated_state.get("executed_tools") or [])
+    seen_tools = set(executed_tools)
     
-    updated_state["mcp_results"].append(mcp_result)
-    
-    # Update executed tools list
-    if "executed_tools" not in updated_state or updated_state["executed_tools"] is None:
-        updated_state["executed_tools"] = []
+    for tool_name, result in tool_results:
+        mcp_results.append({
+            "tool_name": tool_name,
+            "result": result,
+            "success": result.get("success", False) if isinstance(result, dict) else True,
+            "timestamp": timestamp,
+            "agent": agent_name
+        })
+        
+        # Update executed tools list
+        if tool_name not in seen_tools:
+            seen_tools.add(tool_name)
+            executed_tools.append(tool_name)
     
-    if tool_name not in updated_state["executed_tools"]:
-        updated_state["executed_tools"].append(tool_name)
+    updated_state["mcp_results"] = mcp_results
+    updated_state["executed_tools"] = executed_tools
     
     return updated_state
 
 
+def summarize_mcp_results(mcp_results: Iterable[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    mcp_results without the raw tool payloads, for state that outlives the request.
+    Keeps each entry's bookkeeping fields plus the error of failed calls.
+    """
+    summaries = []
+    for entry in mcp_results:
+        summary = {
+            "tool_name": entry.get("tool_name"),
+            "success": entry.get("success", False),
+            "timestamp": entry.get("timestamp"),
+            "agent": entry.get("agent")
+        }
+        result = entry.get("result")
+        if not summary["success"] and isinstance(result, dict) and result.get("error"):
+            summary["error"] = str(result["error"])
+        summaries.append(summary)
+    return summaries
+
+
 def calculate_state_health(state: ChatState) -> Dict[str, Any]:
     """Calculate overall state health metrics"""
     
@@ -0,0 +1,69 @@
+"""
+Tool Execution Agent - required-tool abort behaviour
+"""
+
+import asyncio
+import unittest
+
+from agents.tool_execution_agent import ToolExecutionAgent
+
+
+class FakeClient:
+    """MCP client whose tools fail, succeed or hang depending on their name"""
+
+    def __init__(self):
+        self.started = []
+
+    async def execute_tool(self, tool_name, parameters):
+        self.started.append(tool_name)
+        if tool_name.startswith("fail"):
+            return {"success": False, "error": "boom", "tool_name": tool_name}
+        if tool_name.startswith("slow"):
+            await asyncio.sleep(10)
+        return {"success": True, "tool_name": tool_name}
+
+
+class FakeManager:
+    def __init__(self, client):
+        self.client = client
+
+    async def get_client(self, session_id="default"):
+        return self.client
+
+
+class RequiredToolAbortTest(unittest.IsolatedAsyncioTestCase):
+
+    async def asyncSetUp(self):
+        self.client = FakeClient()
+        self.agent = ToolExecutionAgent(FakeManager(self.client))
+
+    async def _run(self, tool_plan):
+        state = {"session_id": "s1", "tool_plan": tool_plan}
+        return await asyncio.wait_for(self.agent._execute_tools_concurrently(tool_plan, state, 8), timeout=5)
+
+    async def test_required_failure_aborts_siblings_and_later_waves(self):
+        results = await self._run([
+            {"name": "fail_primary", "parameters": {}, "required": True},
+            {"name": "slow_sibling", "parameters": {}},
+            {"name": "dependent", "parameters": {}, "depends_on": ["fail_primary"]},
+        ])
+
+        self.assertEqual(results[0]["error"], "boom")
+        self.assertEqual(results[1], {"success": False, "error": "aborted", "tool_name": "slow_sibling"})
+        self.assertEqual(results[2], {"success": False, "error": "aborted", "tool_name": "dependent"})
+        self.assertNotIn("dependent", self.client.started)
+
+    async def test_optional_failure_leaves_siblings_running(self):
+        results = await self._run([
+            {"name": "fail_optional", "parameters": {}, "required": False},
+            {"name": "sibling", "parameters": {}},
+            {"name": "dependent", "parameters": {}, "depends_on": ["fail_optional"]},
+        ])
+
+        self.assertFalse(results[0]["success"])
+        self.assertTrue(results[1]["success"])
+        self.assertTrue(results[2]["success"])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,79 @@
+"""
+Bounded Memory Saver - In-memory LangGraph checkpointer that keeps only the most recent threads
+"""
+
+import logging
+from collections import OrderedDict
+from typing import Any, Dict, Tuple
+
+from langgraph.checkpoint.memory import MemorySaver
+
+logger = logging.getLogger(__name__)
+
+
+class BoundedMemorySaver(MemorySaver):
+    """
+    MemorySaver that tracks threads in LRU order and deletes the least recently used
+    thread's checkpoints, writes and blobs once more than maxsize threads are stored.
+    With latest_only, each put also drops the thread's earlier checkpoints and the
+    channel blobs they alone referenced - only the latest state is ever read back, and
+    otherwise every step's tool results stay in memory for the life of the thread.
+    The async methods delegate to the sync ones, so overriding those covers both.
+    """
+
+    def __init__(self, maxsize: int = 2048, latest_only: bool = True, **kwargs):
+        super().__init__(**kwargs)
+        self.maxsize = max(1, maxsize)
+        self.latest_only = latest_only
+        self._threads: "OrderedDict[str, None]" = OrderedDict()
+        self._blob_versions: Dict[Tuple[str, str, str], Any] = {}  # (thread, ns, channel) -> stored version
+
+    def put(self, config, checkpoint, metadata, new_versions):
+        result = super().put(config, checkpoint, metadata, new_versions)
+        if self.latest_only:
+            self._prune(result["configurable"], new_versions)
+        self._touch(config["configurable"]["thread_id"])
+        return result
+
+    def get_tuple(self, config):
+        checkpoint_tuple = super().get_tuple(config)
+        if checkpoint_tuple is not None:
+            thread_id = config["configurable"]["thread_id"]
+            if thread_id in self._threads:
+                self._threads.move_to_end(thread_id)
+        return checkpoint_tuple
+
+    def delete_thread(self, thread_id: str) -> None:
+        self._threads.pop(thread_id, None)
+        self._delete_thread(thread_id)
+
+    def _delete_thread(self, thread_id: str):
+        super().delete_thread(thread_id)
+        for key in [key for key in self._blob_versions if key[0] == thread_id]:
+            del self._blob_versions[key]
+
+    def _prune(self, configurable: Dict[str, Any], new_versions: Dict[str, Any]):
+        """Keep only the checkpoint just written for its thread/namespace"""
+        thread_id = configurable["thread_id"]
+        checkpoint_ns = configurable["checkpoint_ns"]
+        checkpoints = self.storage[thread_id][checkpoint_ns]
+        for checkpoint_id in [cid for cid in checkpoints if cid != configurable["checkpoint_id"]]:
+            del checkpoints[checkpoint_id]
+            self.writes.pop((thread_id, checkpoint_ns, checkpoint_id), None)
+
+        # Channels not in new_versions still point at their stored blob, so only replaced ones go
+        for channel, version in new_versions.items():
+            key = (thread_id, checkpoint_ns, channel)
+            old_version = self._blob_versions.get(key)
+            if old_version is not None and old_version != version:
+                self.blobs.pop((thread_id, checkpoint_ns, channel, old_version), None)
+            self._blob_versions[key] = version
+
+    def _touch(self, thread_id: str):
+        """Mark thread_id as most recently used and evict threads over the limit"""
+        self._threads[thread_id] = None
+        self._threads.move_to_end(thread_id)
+        while len(self._threads) > self.maxsize:
+            oldest, _ = self._threads.popitem(last=False)
+            logger.debug("Evicting checkpoints for thread %s", oldest)
+            self._delete_thread(oldest)
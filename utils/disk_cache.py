@@ -0,0 +1,79 @@
+"""
+Disk Cache - Small SQLite-backed key/value store that survives process restarts
+"""
+
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from typing import Any, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class DiskCache:
+    """
+    JSON-serializable key/value cache persisted in a SQLite file.
+    Entries expire after ttl seconds; beyond max_entries rows the oldest are deleted on write.
+    Calls block on disk I/O - run them in an executor from async code.
+    Errors are logged and treated as cache misses so callers never fail because of the cache.
+    """
+
+    def __init__(self, path: str, ttl: float = 86400, max_entries: int = 5000):
+        self.path = path
+        self.ttl = ttl
+        self.max_entries = max(1, max_entries)
+        self._lock = threading.Lock()
+        self._conn: Optional[sqlite3.Connection] = None
+
+    def _connect(self) -> sqlite3.Connection:
+        """Open the database lazily on first use"""
+        if self._conn is None:
+            directory = os.path.dirname(self.path)
+            if directory:
+                os.makedirs(directory, exist_ok=True)
+            conn = sqlite3.connect(self.path, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS cache (key BLOB PRIMARY KEY, value TEXT NOT NULL, created_at REAL NOT NULL)"
+            )
+            conn.execute("CREATE INDEX IF NOT EXISTS cache_created_at ON cache (created_at)")
+            self._conn = conn
+        return self._conn
+
+    def get(self, key: bytes) -> Optional[Any]:
+        """Return the cached value for key, or None if missing or expired"""
+        try:
+            with self._lock:
+                row = self._connect().execute(
+                    "SELECT value, created_at FROM cache WHERE key = ?", (key,)
+                ).fetchone()
+            if row is None or time.time() - row[1] >= self.ttl:
+                return None
+            return json.loads(row[0])
+        except (sqlite3.Error, OSError, ValueError) as e:
+            logger.warning(f"⚠️ Disk cache read failed ({self.path}): {e}")
+            return None
+
+    def set(self, key: bytes, value: Any):
+        """Store value under key and drop expired entries and the oldest ones over max_entries"""
+        try:
+            payload = json.dumps(value, default=str)
+            now = time.time()
+            with self._lock:
+                conn = self._connect()
+                with conn:
+                    conn.execute(
+                        "INSERT OR REPLACE INTO cache (key, value, created_at) VALUES (?, ?, ?)",
+                        (key, payload, now)
+                    )
+                    conn.execute("DELETE FROM cache WHERE created_at < ?", (now - self.ttl,))
+                    conn.execute(
+                        "DELETE FROM cache WHERE key IN "
+                        "(SELECT key FROM cache ORDER BY created_at DESC LIMIT -1 OFFSET ?)",
+                        (self.max_entries,)
+                    )
+        except (sqlite3.Error, OSError, TypeError, ValueError) as e:
+            logger.warning(f"⚠️ Disk cache write failed ({self.path}): {e}")
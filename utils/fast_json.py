@@ -0,0 +1,35 @@
+"""
+Fast JSON - orjson-backed (de)serialization for websocket frames, with a stdlib json fallback
+"""
+
+import json
+from typing import Any, Union
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson is optional, stdlib json works too
+    orjson = None
+
+
+def dumps(obj: Any) -> str:
+    """
+    Serialize obj to a compact JSON string.
+    Frames stay text (not bytes) because the frontend JSON.parses event.data directly.
+    """
+    if orjson is not None:
+        return orjson.dumps(obj).decode()
+    return json.dumps(obj, separators=(",", ":"), ensure_ascii=False)
+
+
+def dumpb(obj: Any) -> bytes:
+    """Serialize obj to compact UTF-8 JSON bytes for HTTP bodies; unknown types are rendered with str()"""
+    if orjson is not None:
+        return orjson.dumps(obj, default=str)
+    return json.dumps(obj, separators=(",", ":"), ensure_ascii=False, default=str).encode()
+
+
+def loads(data: Union[str, bytes]) -> Any:
+    """Parse a JSON text or bytes frame without decoding bytes to str first"""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
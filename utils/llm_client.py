@@ -5,15 +5,40 @@ LLM Client for dynamic decision making throughout the LangGraph workflow
 import os
 import logging
 import json
+import re
 from typing import Dict, Any, List, Optional
 from dotenv import load_dotenv
 from langchain_openai import ChatOpenAI
+import config
+from utils.token_coalescer import TokenCoalescer
+from utils.session_store import SessionStore
+from utils import openai_http
 
 # Load environment variables
 load_dotenv()
 
 logger = logging.getLogger(__name__)
 
+# Router pre-filter: queries that obviously do or don't need tools skip the router LLM.
+# Tool keywords win when both match ("hi, any incidents today?")
+_TOOL_KEYWORDS_RE = re.compile(
+    r"\b(?:pods?|incidents?|tickets?|deploy\w*|logs?|alerts?|changelogs?|resources?)\b", re.IGNORECASE
+)
+_CHAT_KEYWORDS_RE = re.compile(r"\b(?:hi|hello|thanks|thank you|joke|who are you)\b", re.IGNORECASE)
+
+# Router LLM decisions keyed by the normalized query prefix, expiring after an hour
+_ROUTER_CACHE = SessionStore(maxsize=4096, ttl=3600)
+_ROUTER_CACHE_KEY_LENGTH = 128
+
+# Case, punctuation and spacing don't change routing ("Is checkout down?" == "is checkout  down")
+_ROUTER_PUNCT_RE = re.compile(r"[^\w\s]+")
+_ROUTER_SPACE_RE = re.compile(r"\s+")
+
+
+def _router_cache_key(user_query: str) -> str:
+    normalized = _ROUTER_SPACE_RE.sub(" ", _ROUTER_PUNCT_RE.sub(" ", user_query.lower())).strip()
+    return normalized[:_ROUTER_CACHE_KEY_LENGTH]
+
 
 class LLMDecisionMaker:
     """
@@ -35,14 +60,18 @@ class LLMDecisionMaker:
             self.llm = ChatOpenAI(
                 model=self.model_name,
                 temperature=self.temperature,
-                max_tokens=2000
+                max_tokens=2000,
+                http_client=openai_http.http_client,
+                http_async_client=openai_http.async_http_client
             )
             
             # Router client for fast binary decisions
             self.router_llm = ChatOpenAI(
                 model=self.router_model_name,
                 temperature=0,  # Strict deterministic outputs
-                max_tokens=100
+                max_tokens=100,
+                http_client=openai_http.http_client,
+                http_async_client=openai_http.async_http_client
             )
             logger.info(f"✅ LLM clients initialized. Main: {self.model_name}, Router: {self.router_model_name}")
         else:
@@ -72,6 +101,20 @@ class LLMDecisionMaker:
         
         Uses gpt-4o-mini for speed (~200ms) and cost efficiency.
         """
+        # Obvious cases don't need the LLM
+        if _TOOL_KEYWORDS_RE.search(user_query):
+            logger.info(f"🚦 Router keyword match for '{user_query[:50]}...': Enhanced Mode")
+            return True
+        if _CHAT_KEYWORDS_RE.search(user_query):
+            logger.info(f"🚦 Router keyword match for '{user_query[:50]}...': Simple Mode")
+            return False
+        
+        cache_key = _router_cache_key(user_query)
+        cached = _ROUTER_CACHE.get(cache_key)
+        if cached is not None:
+            logger.debug("🚦 Router cache hit for '%.50s'", user_query)
+            return cached
+        
         # Use router_llm if available, otherwise fall back to main llm
         llm_to_use = self.router_llm if self.router_llm else self.llm
         
@@ -113,9 +156,12 @@ User Query: """
             content = self._extract_json_from_response(response.content)
             result = json.loads(content)
             
-            decision = result.get("use_tools", False)
+            decision = bool(result.get("use_tools", False))
             mode = 'Enhanced Mode' if decision else 'Simple Mode'
             logger.info(f"🚦 Router ({self.router_model_name}) decision for '{user_query[:50]}...': {mode}")
+            
+            # Only real decisions are cached - the failure fallback below should be retried
+            _ROUTER_CACHE[cache_key] = decision
             return decision
             
         except Exception as e:
@@ -201,7 +247,7 @@ Examples:
                 {"role": "user", "content": f"Analyze this query: {user_query}"}
             ]
             
-            response = self.llm.invoke(messages)
+            response = await self.llm.ainvoke(messages)
             content = response.content
             
             json_str = self._extract_json_from_response(content)
@@ -322,13 +368,22 @@ Rule: If query asks for Entity A "and its/their/affected/related" Entity B:
 - Trust tool descriptions over assumptions
 - Related tools are mentioned in descriptions - use them together when appropriate
 
+**Step 8: Mark required tools**
+- Set `"required": true` on a tool when the rest of the plan is useless without its result
+  * Example: get_resource_by_id in a comprehensive plan - if the resource can't be fetched, its version/metadata/tickets lookups are pointless
+- Set `"required": false` (or omit it) on every other tool - most plans, including all multi-entity plans, have no required tool
+- If a required tool fails, the remaining tools in the plan are aborted
+
+OUTPUT FORMAT:
+[{{"name": "tool_name", "parameters": {{...}}, "required": true|false}}, ...]
+
 LEARN FROM PATTERNS (generalize, don't memorize):
 
 Pattern A - Direct ID access:
 Query: "Everything about resource 50944068"
 Analysis: {{"specific_id": "50944068", "scope": "single", "comprehensive": true}}
 Thought Process: Have ID + want comprehensive → Use get_*_by_id + all related tools
-Plan: [{{"name": "get_resource_by_id", "parameters": {{"resource_id": "50944068"}}}}, {{"name": "get_resource_version", "parameters": {{"resource_id": "50944068"}}}}, {{"name": "get_resource_metadata", "parameters": {{"resource_id": "50944068"}}}}, {{"name": "get_resource_tickets", "parameters": {{"resource_id": "50944068"}}}}, {{"name": "get_changelog_by_resource", "parameters": {{"resource_id": "50944068"}}}}, {{"name": "get_notifications_by_resource", "parameters": {{"resource_id": "50944068"}}}}]
+Plan: [{{"name": "get_resource_by_id", "parameters": {{"resource_id": "50944068"}}, "required": true}}, {{"name": "get_resource_version", "parameters": {{"resource_id": "50944068"}}}}, {{"name": "get_resource_metadata", "parameters": {{"resource_id": "50944068"}}}}, {{"name": "get_resource_tickets", "parameters": {{"resource_id": "50944068"}}}}, {{"name": "get_changelog_by_resource", "parameters": {{"resource_id": "50944068"}}}}, {{"name": "get_notifications_by_resource", "parameters": {{"resource_id": "50944068"}}}}]
 
 Pattern B - Name lookup with comprehensive intent:
 Query: "Tell me everything about vector-0"
@@ -411,7 +466,7 @@ Now apply these principles to create the optimal tool plan. Respond ONLY with va
                 {"role": "user", "content": "Create the tool execution plan."}
             ]
             
-            response = self.llm.invoke(messages)
+            response = await self.llm.ainvoke(messages)
             content = response.content
             
             json_str = self._extract_json_from_response(content)
@@ -752,9 +807,6 @@ Now apply these principles to create the optimal tool plan. Respond ONLY with va
                 else:
                     logger.warning("⚠️ No suggestions found or suggestion search failed")
             
-            # Include conversation history for context awareness
-            conversation_history = state.get("conversation_history", [])
-            
             context = {
                 "original_query": state.get("user_query"),
                 "tool_results": tool_data,
@@ -815,51 +867,8 @@ Write your response as flowing narrative paragraphs, NOT as structured lists or
 
 Format: Flowing narrative analysis → Integrated data points → Contextual gaps → Natural conclusions."""
             
-            # Build messages with conversation history for context
-            messages = [{"role": "system", "content": system_prompt}]
-            
-            # Add conversation history (last 5 turns for context)
-            for msg in conversation_history[-5:]:
-                if msg.get("role") == "user":
-                    messages.append({"role": "user", "content": msg.get("content", "")})
-                elif msg.get("role") == "assistant":
-                    messages.append({"role": "assistant", "content": msg.get("content", "")})
-            
-            # Add current query
-            messages.append({"role": "user", "content": f"Answer this: {state.get('user_query')}"})
-            
-            import re
-            
-            if websocket:
-                content = ""
-                pending_newlines = 0
-                async for chunk in self.llm.astream(messages):
-                    token = chunk.content
-                    if token:
-                        content += token
-                        # Streaming post-process: collapse multiple newlines in real-time
-                        for char in token:
-                            if char == '\n':
-                                pending_newlines += 1
-                            else:
-                                # Flush pending newlines (max 1)
-                                if pending_newlines > 0:
-                                    await websocket.send_text(json.dumps({"on_chat_model_stream": "\n"}))
-                                    pending_newlines = 0
-                                # Send the actual character
-                                await websocket.send_text(json.dumps({"on_chat_model_stream": char}))
-                        
-                # Flush any remaining newline (max 1)
-                if pending_newlines > 0:
-                    await websocket.send_text(json.dumps({"on_chat_model_stream": "\n"}))
-            else:
-                response = self.llm.invoke(messages)
-                content = response.content
-            
-            # Post-process: Remove excessive newlines for compact display
-            # Replace 3+ newlines with 2, and 2 newlines with 1
-            content = re.sub(r'\n{3,}', '\n\n', content)  # Max 2 newlines
-            content = re.sub(r'\n\n', '\n', content)       # Convert double to single
+            messages = self._build_chat_messages(system_prompt, state, f"Answer this: {state.get('user_query')}")
+            content = await self._complete_response(messages, websocket)
             
             metadata_response = await self._generate_metadata(state, content)
             
@@ -874,6 +883,80 @@ Format: Flowing narrative analysis → Integrated data points → Contextual gap
             logger.error(f"Response generation failed: {e}")
             return self._fallback_response_generation(state)
     
+    async def generate_conversational_response(self, state: Dict[str, Any], websocket=None) -> str:
+        """Answer a conversational turn from the chat history alone - no tool data and no metadata call"""
+        try:
+            if not self.llm:
+                return self._fallback_response_generation(state)["final_response"]
+            
+            system_prompt = """You are a friendly technical assistant for an infrastructure observability platform.
+This message did not need any tools. Reply briefly and naturally, using the previous conversation for context.
+Do NOT invent incidents, resources, logs, or other operational data - offer to look them up instead."""
+            
+            messages = self._build_chat_messages(system_prompt, state, state.get("user_query", ""))
+            return await self._complete_response(messages, websocket)
+            
+        except Exception as e:
+            logger.error(f"Conversational response generation failed: {e}")
+            return self._fallback_response_generation(state)["final_response"]
+    
+    def _build_chat_messages(self, system_prompt: str, state: Dict[str, Any], user_content: str) -> List[Dict[str, str]]:
+        """System prompt, the last 5 turns of conversation history, then the current user message"""
+        messages = [{"role": "system", "content": system_prompt}]
+        
+        # Add conversation history (last 5 turns for context)
+        for msg in state.get("conversation_history", [])[-5:]:
+            if msg.get("role") == "user":
+                messages.append({"role": "user", "content": msg.get("content", "")})
+            elif msg.get("role") == "assistant":
+                messages.append({"role": "assistant", "content": msg.get("content", "")})
+        
+        # Add current query
+        messages.append({"role": "user", "content": user_content})
+        return messages
+    
+    async def _complete_response(self, messages: List[Dict[str, str]], websocket=None) -> str:
+        """Run the main LLM - streamed to the websocket if given - and compact newlines"""
+        if websocket:
+            parts: List[str] = []
+            pending_newlines = 0
+            stream = TokenCoalescer(
+                websocket,
+                max_tokens=config.STREAM_COALESCE_MAX_TOKENS,
+                max_bytes=config.STREAM_COALESCE_MAX_BYTES,
+                max_wait_ms=config.STREAM_COALESCE_MAX_WAIT_MS
+            )
+            async for chunk in self.llm.astream(messages):
+                token = chunk.content
+                if token:
+                    parts.append(token)
+                    # Streaming post-process: collapse multiple newlines in real-time
+                    for char in token:
+                        if char == '\n':
+                            pending_newlines += 1
+                        else:
+                            # Flush pending newlines (max 1)
+                            if pending_newlines > 0:
+                                await stream.push('\n')
+                                pending_newlines = 0
+                            # Buffer the actual character
+                            await stream.push(char)
+                    
+            # Flush any remaining newline (max 1)
+            if pending_newlines > 0:
+                await stream.push('\n')
+            await stream.flush()
+            content = "".join(parts)
+        else:
+            response = await self.llm.ainvoke(messages)
+            content = response.content
+        
+        # Post-process: Remove excessive newlines for compact display
+        # Replace 3+ newlines with 2, and 2 newlines with 1
+        content = re.sub(r'\n{3,}', '\n\n', content)  # Max 2 newlines
+        content = re.sub(r'\n\n', '\n', content)       # Convert double to single
+        return content
+    
     async def _generate_metadata(self, state: Dict[str, Any], response_text: str) -> Dict[str, Any]:
         """Generate forward links and recommendations"""
         try:
@@ -9,10 +9,20 @@ import aiohttp
 import json
 from typing import Dict, Any, List, Optional
 from datetime import datetime
+import config
 
 logger = logging.getLogger(__name__)
 
 
+def _new_http_session() -> aiohttp.ClientSession:
+    """HTTP session with a keep-alive connection pool sized for concurrent tool calls"""
+    connector = aiohttp.TCPConnector(
+        limit=config.MCP_HTTP_MAX_CONNECTIONS,
+        keepalive_timeout=config.MCP_HTTP_KEEPALIVE_S
+    )
+    return aiohttp.ClientSession(connector=connector, timeout=aiohttp.ClientTimeout(total=config.TOOL_TIMEOUT))
+
+
 class MCPClientError(Exception):
     """Custom exception for MCP client errors"""
     pass
@@ -24,8 +34,11 @@ class MCPClient:
     Connects to the MCP server running on localhost
     """
     
-    def __init__(self, server_url: str = "http://localhost:8080"):
+    def __init__(self, server_url: str = "http://localhost:8080", http_session: Optional[aiohttp.ClientSession] = None):
         self.server_url = server_url
+        # Reused HTTP session (keep-alive connection pool); shared sessions are owned by the caller
+        self._http_session = http_session
+        self._owns_session = http_session is None
         self.config = {
             "timeout": 60.0,  # Increased for real API calls
             "max_retries": 3,
@@ -37,6 +50,19 @@ class MCPClient:
         self._cache_time = None
         self._cache_ttl = 300  # 5 minutes
     
+    async def _get_session(self) -> aiohttp.ClientSession:
+        """Return the pooled HTTP session, creating one on first use (or after it was closed)"""
+        if self._http_session is None or self._http_session.closed:
+            self._http_session = _new_http_session()
+            self._owns_session = True
+        return self._http_session
+    
+    async def aclose(self):
+        """Close the HTTP session if this client created it"""
+        if self._owns_session and self._http_session is not None and not self._http_session.closed:
+            await self._http_session.close()
+        self._http_session = None
+    
     async def _get_available_tools(self) -> List[Dict[str, Any]]:
         """Get list of available MCP tools from Node.js server"""
         # Check cache
@@ -45,24 +71,29 @@ class MCPClient:
                 return self._tools_cache
         
         try:
-            async with aiohttp.ClientSession() as session:
-                async with session.get(
-                    f"{self.server_url}/api/mcp/tools",
-                    timeout=aiohttp.ClientTimeout(total=10)
-                ) as response:
-                    if response.status == 200:
-                        data = await response.json()
-                        self._tools_cache = data.get("tools", [])
-                        self._cache_time = datetime.now()
-                        logger.info(f"✅ Fetched {len(self._tools_cache)} MCP tools from server")
-                        return self._tools_cache
-                    else:
-                        logger.error(f"❌ Failed to fetch tools: HTTP {response.status}")
-                        return self._get_fallback_tools()
+            session = await self._get_session()
+            async with session.get(
+                f"{self.server_url}/api/mcp/tools",
+                timeout=aiohttp.ClientTimeout(total=10)
+            ) as response:
+                if response.status == 200:
+                    data = await response.json()
+                    self._tools_cache = data.get("tools", [])
+                    self._cache_time = datetime.now()
+                    logger.info(f"✅ Fetched {len(self._tools_cache)} MCP tools from server")
+                    return self._tools_cache
+                else:
+                    logger.error(f"❌ Failed to fetch tools: HTTP {response.status}")
+                    return self._get_fallback_tools()
         except Exception as e:
             logger.error(f"❌ Error fetching tools from server: {str(e)}")
             return self._get_fallback_tools()
     
+    def invalidate_tools_cache(self):
+        """Force the next tool listing to hit the server"""
+        self._tools_cache = None
+        self._cache_time = None
+    
     def _get_fallback_tools(self) -> List[Dict[str, Any]]:
         """Fallback tool list if server is unavailable"""
         return [
@@ -138,38 +169,38 @@ class MCPClient:
         """Execute tool on Node.js MCP server"""
         
         try:
-            async with aiohttp.ClientSession() as session:
-                payload = {
-                    "tool_name": tool_name,
-                    "parameters": parameters
-                }
+            session = await self._get_session()
+            payload = {
+                "tool_name": tool_name,
+                "parameters": parameters
+            }
+            
+            async with session.post(
+                f"{self.server_url}/api/mcp/execute",
+                json=payload,
+                timeout=aiohttp.ClientTimeout(total=self.config["timeout"])
+            ) as response:
                 
-                async with session.post(
-                    f"{self.server_url}/api/mcp/execute",
-                    json=payload,
-                    timeout=aiohttp.ClientTimeout(total=self.config["timeout"])
-                ) as response:
+                if response.status == 200:
+                    data = await response.json()
+                    
+                    # Add metadata
+                    result = data.get("result", {})
+                    
+                    # DEBUG: Log result structure
+                    if "incidents" in result:
+                        logger.info(f"🔍 MCP DEBUG - Tool {tool_name} returned {len(result.get('incidents', []))} incidents")
+                    
+                    result["tool"] = tool_name
+                    result["parameters"] = parameters
+                    result["timestamp"] = datetime.now().isoformat()
+                    result["success"] = data.get("success", True)
+                    
+                    return result
+                else:
+                    error_text = await response.text()
+                    raise MCPClientError(f"Server returned {response.status}: {error_text}")
                     
-                    if response.status == 200:
-                        data = await response.json()
-                        
-                        # Add metadata
-                        result = data.get("result", {})
-                        
-                        # DEBUG: Log result structure
-                        if "incidents" in result:
-                            logger.info(f"🔍 MCP DEBUG - Tool {tool_name} returned {len(result.get('incidents', []))} incidents")
-                        
-                        result["tool"] = tool_name
-                        result["parameters"] = parameters
-                        result["timestamp"] = datetime.now().isoformat()
-                        result["success"] = data.get("success", True)
-                        
-                        return result
-                    else:
-                        error_text = await response.text()
-                        raise MCPClientError(f"Server returned {response.status}: {error_text}")
-                        
         except asyncio.TimeoutError:
             raise MCPClientError(f"Tool {tool_name} timed out after {self.config['timeout']}s")
         except aiohttp.ClientError as e:
@@ -238,24 +269,24 @@ class MCPClient:
     async def health_check(self) -> Dict[str, Any]:
         """Check the health status of the MCP server"""
         try:
-            async with aiohttp.ClientSession() as session:
-                async with session.get(
-                    f"{self.server_url}/health",
-                    timeout=aiohttp.ClientTimeout(total=5)
-                ) as response:
-                    if response.status == 200:
-                        return {
-                            "status": "healthy",
-                            "server_url": self.server_url,
-                            "timestamp": datetime.now().isoformat()
-                        }
-                    else:
-                        return {
-                            "status": "unhealthy",
-                            "server_url": self.server_url,
-                            "error": f"HTTP {response.status}",
-                            "timestamp": datetime.now().isoformat()
-                        }
+            session = await self._get_session()
+            async with session.get(
+                f"{self.server_url}/health",
+                timeout=aiohttp.ClientTimeout(total=5)
+            ) as response:
+                if response.status == 200:
+                    return {
+                        "status": "healthy",
+                        "server_url": self.server_url,
+                        "timestamp": datetime.now().isoformat()
+                    }
+                else:
+                    return {
+                        "status": "unhealthy",
+                        "server_url": self.server_url,
+                        "error": f"HTTP {response.status}",
+                        "timestamp": datetime.now().isoformat()
+                    }
         except Exception as e:
             return {
                 "status": "unreachable",
@@ -271,6 +302,7 @@ class MCPClientManager:
     def __init__(self, server_url: str = "http://localhost:8080"):
         self.server_url = server_url
         self.clients = {}
+        self._http_session: Optional[aiohttp.ClientSession] = None  # Shared by all clients
         self.connection_stats = {
             "total_requests": 0,
             "successful_requests": 0,
@@ -281,7 +313,9 @@ class MCPClientManager:
     async def get_client(self, session_id: str = "default") -> MCPClient:
         """Get or create MCP client for a session"""
         if session_id not in self.clients:
-            client = MCPClient(server_url=self.server_url)
+            if self._http_session is None or self._http_session.closed:
+                self._http_session = _new_http_session()
+            client = MCPClient(server_url=self.server_url, http_session=self._http_session)
             self.clients[session_id] = client
             logger.info(f"✅ Created MCP client for session {session_id}")
         
@@ -297,3 +331,10 @@ class MCPClientManager:
         """Cleanup all MCP client sessions"""
         self.clients.clear()
         logger.info("🧹 Cleaned up all MCP client sessions")
+    
+    async def aclose(self):
+        """Drop all clients and close the shared HTTP session"""
+        await self.cleanup_all_sessions()
+        if self._http_session is not None and not self._http_session.closed:
+            await self._http_session.close()
+        self._http_session = None
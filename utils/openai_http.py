@@ -0,0 +1,30 @@
+"""
+OpenAI HTTP - Connection pools shared by every OpenAI model client in the process
+"""
+
+import httpx
+
+import config
+
+try:
+    import h2  # noqa: F401 - httpx only needs it importable to negotiate HTTP/2
+    _HTTP2 = True
+except ImportError:  # pragma: no cover - HTTP/2 is optional, pooled HTTP/1.1 works too
+    _HTTP2 = False
+
+_LIMITS = httpx.Limits(
+    max_connections=config.OPENAI_HTTP_MAX_CONNECTIONS,
+    max_keepalive_connections=config.OPENAI_HTTP_MAX_KEEPALIVE
+)
+# Matches the OpenAI SDK's own default; a shorter read timeout would cut off long completions
+_TIMEOUT = httpx.Timeout(config.OPENAI_HTTP_TIMEOUT_S, connect=10.0)
+
+# Pass as http_async_client / http_client so all models reuse the same keep-alive (and TLS) connections
+async_http_client = httpx.AsyncClient(http2=_HTTP2, limits=_LIMITS, timeout=_TIMEOUT)
+http_client = httpx.Client(http2=_HTTP2, limits=_LIMITS, timeout=_TIMEOUT)  # For sync invoke() calls
+
+
+async def aclose():
+    """Close both pools on shutdown"""
+    await async_http_client.aclose()
+    http_client.close()
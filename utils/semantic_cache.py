@@ -0,0 +1,96 @@
+"""
+Semantic Cache - Reuses responses for queries whose embeddings are near-duplicates of a recent query
+"""
+
+import logging
+import math
+import operator
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+Embedder = Callable[[str], Awaitable[List[float]]]
+
+
+class SemanticCache:
+    """
+    Stores (unit-length embedding, value) pairs and returns the value of the most similar
+    stored query when its cosine similarity reaches threshold. Entries expire after ttl
+    seconds (responses describe live infrastructure data) and the oldest are evicted past
+    maxsize. Embeddings of recently seen query strings are kept, so a miss followed by
+    store() embeds the query only once. Lookup is a linear scan - fine for a few hundred
+    low-dimensional vectors without pulling in a vector index.
+    """
+
+    def __init__(self, embed: Embedder, threshold: float = 0.92, ttl: float = 300,
+                 maxsize: int = 512, embedding_cache_size: int = 1024):
+        self._embed = embed
+        self.threshold = threshold
+        self.ttl = ttl
+        self.maxsize = max(1, maxsize)
+        self.embedding_cache_size = embedding_cache_size
+        self._entries: "OrderedDict[int, Tuple[float, List[float], Any]]" = OrderedDict()  # id -> (stored_at, vector, value)
+        self._next_id = 0
+        self._embeddings: "OrderedDict[str, List[float]]" = OrderedDict()
+
+    async def lookup(self, query: str, accept: Optional[Callable[[Any], bool]] = None) -> Optional[Any]:
+        """Value stored for the most similar query above the threshold (None on a miss or embedding failure)"""
+        self._purge_expired()
+        if not self._entries:
+            return None
+        vector = await self._get_embedding(query)
+        if vector is None:
+            return None
+
+        best_score, best_value = self.threshold, None
+        for _, stored_vector, value in self._entries.values():
+            if accept is not None and not accept(value):
+                continue
+            score = sum(map(operator.mul, vector, stored_vector))
+            if score >= best_score:
+                best_score, best_value = score, value
+
+        if best_value is not None:
+            logger.info("🎯 Semantic cache hit (similarity %.3f)", best_score)
+        return best_value
+
+    async def store(self, query: str, value: Any):
+        """Cache value for query, evicting the oldest entries over maxsize"""
+        vector = await self._get_embedding(query)
+        if vector is None:
+            return
+        self._entries[self._next_id] = (time.monotonic(), vector, value)
+        self._next_id += 1
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+
+    async def _get_embedding(self, query: str) -> Optional[List[float]]:
+        """Unit-length embedding of query, reusing recent results for the same string"""
+        vector = self._embeddings.get(query)
+        if vector is not None:
+            self._embeddings.move_to_end(query)
+            return vector
+
+        try:
+            raw = await self._embed(query)
+        except Exception as e:
+            logger.warning(f"⚠️ Semantic cache embedding failed, bypassing cache: {e}")
+            return None
+        norm = math.sqrt(sum(x * x for x in raw)) or 1.0
+        vector = [x / norm for x in raw]
+
+        self._embeddings[query] = vector
+        if len(self._embeddings) > self.embedding_cache_size:
+            self._embeddings.popitem(last=False)
+        return vector
+
+    def _purge_expired(self):
+        """Drop expired entries; they sit at the front because entries are only appended"""
+        cutoff = time.monotonic() - self.ttl
+        while self._entries:
+            stored_at = next(iter(self._entries.values()))[0]
+            if stored_at >= cutoff:
+                break
+            self._entries.popitem(last=False)
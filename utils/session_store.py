@@ -0,0 +1,66 @@
+"""
+Session Store - Bounded in-memory session map with LRU eviction and idle TTL
+"""
+
+import time
+from collections import OrderedDict
+from typing import Any
+
+_MISSING = object()
+
+
+class SessionStore:
+    """
+    Maps session ids to values, oldest write first.
+    Entries expire ttl seconds after their last write; once maxsize is exceeded the
+    least recently written session is evicted. All operations are amortized O(1).
+    """
+
+    def __init__(self, maxsize: int = 10_000, ttl: float = 300):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()  # session_id -> (written_at, value)
+
+    def __setitem__(self, session_id: str, value: Any):
+        self._entries[session_id] = (time.monotonic(), value)
+        self._entries.move_to_end(session_id)
+        while len(self._entries) > self.maxsize:
+            self._entries.popitem(last=False)
+        self._purge_expired()
+
+    def get(self, session_id: str, default: Any = None) -> Any:
+        """Return the session value, dropping it if it has expired"""
+        entry = self._entries.get(session_id)
+        if entry is None:
+            return default
+        if time.monotonic() - entry[0] > self.ttl:
+            del self._entries[session_id]
+            return default
+        return entry[1]
+
+    def pop(self, session_id: str, default: Any = None) -> Any:
+        """Remove the session and return its value (default if missing or expired)"""
+        entry = self._entries.pop(session_id, None)
+        if entry is None or time.monotonic() - entry[0] > self.ttl:
+            return default
+        return entry[1]
+
+    def clear(self):
+        """Remove all sessions"""
+        self._entries.clear()
+
+    def __contains__(self, session_id: str) -> bool:
+        return self.get(session_id, _MISSING) is not _MISSING
+
+    def __len__(self) -> int:
+        self._purge_expired()
+        return len(self._entries)
+
+    def _purge_expired(self):
+        """Drop expired entries; they sit at the front because writes move entries to the end"""
+        cutoff = time.monotonic() - self.ttl
+        while self._entries:
+            written_at = next(iter(self._entries.values()))[0]
+            if written_at >= cutoff:
+                break
+            self._entries.popitem(last=False)
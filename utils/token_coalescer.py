@@ -0,0 +1,70 @@
+"""
+Token Coalescer - Buffers streamed tokens and sends them to the websocket in fewer frames
+"""
+
+import asyncio
+import logging
+from typing import List, Optional, Set
+
+from utils import fast_json
+
+logger = logging.getLogger(__name__)
+
+
+class TokenCoalescer:
+    """
+    Collects tokens and sends them as one {"on_chat_model_stream": "<joined text>"} frame
+    once max_tokens or max_bytes is reached, or max_wait_ms after the first buffered token.
+    The payload stays a string so the frontend can keep appending it as-is.
+    Call flush() before sending any frame that must follow the streamed text.
+    """
+
+    def __init__(self, websocket, max_tokens: int = 16, max_bytes: int = 512, max_wait_ms: float = 15):
+        self.websocket = websocket
+        self.max_tokens = max(1, max_tokens)
+        self.max_bytes = max_bytes
+        self.max_wait = max(0.0, max_wait_ms) / 1000
+        self._buffer: List[str] = []
+        self._size = 0
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._send_lock = asyncio.Lock()  # Keeps frames in push order across timer and inline flushes
+        self._tasks: Set[asyncio.Task] = set()
+
+    async def push(self, token: str):
+        """Buffer token, sending the buffer right away if it is full"""
+        if not token:
+            return
+        self._buffer.append(token)
+        self._size += len(token)
+
+        if len(self._buffer) >= self.max_tokens or self._size >= self.max_bytes:
+            await self.flush()
+        elif self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(self.max_wait, self._flush_later)
+
+    async def flush(self):
+        """Send everything buffered so far as a single frame"""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+        async with self._send_lock:
+            if not self._buffer:
+                return
+            text = "".join(self._buffer)
+            self._buffer = []
+            self._size = 0
+            await self.websocket.send_text(fast_json.dumps({"on_chat_model_stream": text}))
+
+    def _flush_later(self):
+        """Timer callback - flush from a task since call_later can't await"""
+        self._timer = None
+        task = asyncio.get_running_loop().create_task(self._flush_quietly())
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _flush_quietly(self):
+        try:
+            await self.flush()
+        except Exception as e:
+            logger.warning(f"⚠️ Failed to flush streamed tokens: {e}")
@@ -0,0 +1,64 @@
+"""
+WebSocket Sender - Queues outgoing frames so a background task sends them while the workflow keeps running
+"""
+
+import asyncio
+import logging
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+
+class QueuedWebSocketSender:
+    """
+    Stand-in for a websocket that only needs send_text: frames are queued and sent in order
+    by run(), so callers don't wait on socket I/O. Frames that pile up while a send is in
+    flight go out together as one JSON array frame (up to max_batch_bytes), which the
+    frontend unpacks; a lone frame is sent unchanged. Call close() once the last frame is
+    queued; run() returns after sending everything before it. The first send failure is
+    kept in .error and later frames are dropped.
+    """
+
+    def __init__(self, websocket, max_batch_bytes: int = 65536):
+        self.websocket = websocket
+        self.max_batch_bytes = max_batch_bytes
+        self.error: Optional[Exception] = None
+        self._queue: "asyncio.Queue[Optional[str]]" = asyncio.Queue()
+
+    async def send_text(self, text: str):
+        if self.error is None:
+            self._queue.put_nowait(text)
+
+    def close(self):
+        """Mark the end of the stream - run() exits once the queue is drained"""
+        self._queue.put_nowait(None)
+
+    async def run(self):
+        """Send queued frames until close(); meant to run as a task alongside the producer"""
+        closed = False
+        while not closed:
+            text = await self._queue.get()
+            if text is None:
+                return
+
+            # Drain whatever else is already queued into the same frame
+            batch = [text]
+            size = len(text)
+            while size < self.max_batch_bytes:
+                try:
+                    text = self._queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    break
+                if text is None:
+                    closed = True
+                    break
+                batch.append(text)
+                size += len(text)
+
+            if self.error is not None:
+                continue
+            try:
+                await self.websocket.send_text(batch[0] if len(batch) == 1 else "[" + ",".join(batch) + "]")
+            except Exception as e:
+                self.error = e
+                logger.warning(f"⚠️ WebSocket send failed, dropping remaining frames: {e}")
@@ -2,23 +2,67 @@
 Enhanced LangGraph Workflow - Intelligent orchestration with MCP tools
 """
 
+import asyncio
 import logging
-import uuid
+import re
+import time
+from uuid import uuid4
 from datetime import datetime
-from typing import Dict, Any
+from itertools import islice
+from typing import Dict, Any, List, Optional, Tuple
 from langgraph.graph import StateGraph, END
-from langgraph.checkpoint.memory import MemorySaver
 
-from state import ChatState, create_initial_state
+from state import ChatState, create_initial_state, summarize_mcp_results
+from utils import fast_json
 from orchestrator import OrchestratorAgent
 from agents.query_analysis_agent import QueryAnalysisAgent
 from agents.tool_execution_agent import ToolExecutionAgent
 from agents.response_enrichment_agent import ResponseEnrichmentAgent
 from agents.comprehensive_query_agent import ComprehensiveQueryAgent
 from utils.mcp_client import MCPClientManager
+from utils.bounded_memory_saver import BoundedMemorySaver
+import config
 
 logger = logging.getLogger(__name__)
 
+# Shared default for missing list fields that are only read (never mutated or stored)
+_NO_ITEMS = ()
+
+# Tool errors that suggest the MCP server's tool list changed since it was cached
+_SCHEMA_DRIFT_RE = re.compile(r"unknown tool|tool .*not found|server returned 404", re.IGNORECASE)
+
+# Conversation history kept per thread: last 10 messages (5 exchanges) to avoid context overflow
+_MAX_HISTORY_MESSAGES = 10
+
+_MISSING = object()
+
+
+def _append_exchange(previous, user_query: str, response: str) -> List[Dict[str, str]]:
+    """
+    History with the new user/assistant pair appended, keeping only the last
+    _MAX_HISTORY_MESSAGES - the kept tail and the new pair go into one new list
+    """
+    return [
+        *islice(previous, max(len(previous) - (_MAX_HISTORY_MESSAGES - 2), 0), None),
+        {
+            "role": "user",
+            "content": user_query
+        },
+        {
+            "role": "assistant", 
+            "content": response
+        }
+    ]
+
+
+def _state_delta(state: Dict[str, Any], updated: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Keys of an agent's updated state copy that it actually replaced.
+    Agents shallow-copy the state and assign new values, so untouched keys are the same
+    objects - leaving them out keeps LangGraph from rewriting (and checkpointing) every channel.
+    """
+    return {key: value for key, value in updated.items() if state.get(key, _MISSING) is not value}
+
 
 class EnhancedLangGraphWorkflow:
     """
@@ -28,6 +72,13 @@ class EnhancedLangGraphWorkflow:
     def __init__(self, mcp_client_manager: MCPClientManager, mcp_server_url: str = "http://localhost:8080"):
         self.mcp_client = mcp_client_manager
         self.mcp_server_url = mcp_server_url
+        self._client = None  # Default MCP client, resolved once on first use
+        self._current_websocket = None  # Set per query by process_query (kept out of state)
+        
+        # (fetched_at, available_tools, tool_schemas) shared across queries for _tools_ttl seconds
+        self._tools_cache: Optional[Tuple[float, List[str], List[Dict[str, Any]]]] = None
+        self._tools_ttl = 60.0
+        self._tools_lock = asyncio.Lock()
         
         # Initialize agents
         self.orchestrator = OrchestratorAgent()
@@ -40,7 +91,7 @@ class EnhancedLangGraphWorkflow:
         self.workflow = self._build_workflow_graph()
         
         # Compile with memory checkpointer
-        self.memory = MemorySaver()
+        self.memory = BoundedMemorySaver(maxsize=config.LANGGRAPH_CHECKPOINT_MAX_THREADS)
         self.app = self.workflow.compile(checkpointer=self.memory)
     
     def _build_workflow_graph(self) -> StateGraph:
@@ -50,8 +101,7 @@ class EnhancedLangGraphWorkflow:
         workflow = StateGraph(ChatState)
         
         # Add nodes for each processing stage
-        workflow.add_node("orchestrator_start", self._orchestrator_start_node)
-        workflow.add_node("query_analysis", self._query_analysis_node)
+        workflow.add_node("orchestrator_start_and_analyze", self._orchestrator_start_and_analyze_node)
         workflow.add_node("tool_execution", self._tool_execution_node)
         workflow.add_node("comprehensive_check", self._comprehensive_check_node)
         workflow.add_node("comprehensive_followup", self._comprehensive_followup_node)
@@ -59,13 +109,17 @@ class EnhancedLangGraphWorkflow:
         workflow.add_node("orchestrator_finish", self._orchestrator_finish_node)
         
         # Set entry point
-        workflow.set_entry_point("orchestrator_start")
+        workflow.set_entry_point("orchestrator_start_and_analyze")
         
         # Define the workflow path with conditional comprehensive query handling
-        workflow.add_edge("orchestrator_start", "query_analysis")
-        workflow.add_edge("query_analysis", "tool_execution")
+        workflow.add_edge("orchestrator_start_and_analyze", "tool_execution")
         workflow.add_edge("tool_execution", "comprehensive_check")
-        workflow.add_edge("comprehensive_check", "comprehensive_followup")
+        # Most queries need no follow-up, so skip that node (and its checkpoint) entirely
+        workflow.add_conditional_edges(
+            "comprehensive_check",
+            self._route_after_comprehensive_check,
+            {"followup": "comprehensive_followup", "enrich": "response_enrichment"}
+        )
         workflow.add_edge("comprehensive_followup", "response_enrichment")
         workflow.add_edge("response_enrichment", "orchestrator_finish")
         workflow.add_edge("orchestrator_finish", END)
@@ -74,16 +128,26 @@ class EnhancedLangGraphWorkflow:
     
     # Node Implementations
     
-    async def _orchestrator_start_node(self, state: ChatState) -> ChatState:
-        """Orchestrator initialization"""
+    async def _orchestrator_start_and_analyze_node(self, state: ChatState) -> ChatState:
+        """Orchestrator initialization and query analysis, overlapping the tool-list fetch with intent analysis"""
         logger.info("🎯 Orchestrator: Starting workflow")
         
-        # Get available tools from MCP client
-        client = await self.mcp_client.get_client()
-        tools_response = await client.list_available_tools()
-        available_tools = [tool.get("name") for tool in tools_response.get("tools", [])]
-        tool_schemas = tools_response.get("tools", [])  # Store full schemas
-        logger.info(f"📋 Loaded {len(available_tools)} available MCP tools")
+        # Get available tools from MCP client (cached across queries)
+        tools = self._peek_tools()
+        intent = None
+        if tools is None:
+            stale = self._tools_cache
+            if stale is not None and await self.query_analyzer.has_cached_analysis(state["user_query"], stale[2]):
+                # Schemas rarely change between refetches - a cached analysis would make the
+                # intent LLM call wasted work, so only refresh the tool list
+                tools = await self._get_tools()
+            else:
+                # Tool list has to be fetched - classify intent with the LLM meanwhile
+                tools, intent = await asyncio.gather(
+                    self._get_tools(),
+                    self.query_analyzer.classify_intent(state["user_query"])
+                )
+        available_tools, tool_schemas = tools
         
         # Add tools to state
         state_with_tools = {
@@ -92,44 +156,52 @@ class EnhancedLangGraphWorkflow:
             "tool_schemas": tool_schemas  # Add full schemas
         }
         
-        updated_state = await self.orchestrator.orchestrate_workflow(state_with_tools)
-        
-        return {
-            **updated_state,
+        orchestrator_updates = await self.orchestrator.orchestrate_workflow(state_with_tools)
+        start_updates = {
+            "available_tools": available_tools,
+            "tool_schemas": tool_schemas,
+            **orchestrator_updates,
             "workflow_status": "running",
             "investigation_depth": 1
         }
-    
-    async def _query_analysis_node(self, state: ChatState) -> ChatState:
-        """Query analysis"""
+        
         logger.info("🔍 Query Analysis: Analyzing user query")
-        return await self.query_analyzer.analyze_query(state)
+        analysis_updates = await self.query_analyzer.analyze_query({**state_with_tools, **start_updates}, intent=intent)
+        
+        return {**start_updates, **analysis_updates}
     
     async def _tool_execution_node(self, state: ChatState) -> ChatState:
         """Tool execution"""
         logger.info("🛠️ Tool Execution: Executing MCP tools")
         
         # Send tool execution notification to websocket if available
-        if hasattr(self, '_current_websocket') and self._current_websocket:
-            tool_plan = state.get("tool_plan", [])
+        if self._current_websocket:
+            tool_plan = state.get("tool_plan") or _NO_ITEMS
             if tool_plan:
-                import json
                 tool_names = [tool.get("name", "Unknown") for tool in tool_plan]
-                await self._current_websocket.send_text(json.dumps({
+                await self._current_websocket.send_text(fast_json.dumps({
                     "on_tool_call": {
                         "tools": tool_names,
                         "count": len(tool_names)
                     }
                 }))
         
-        return await self.tool_executor.execute_tools(state)
+        result = await self.tool_executor.execute_tools(state)
+        self._check_schema_drift(result)
+        return _state_delta(state, result)
     
     async def _comprehensive_check_node(self, state: ChatState) -> ChatState:
         """Check if comprehensive follow-up is needed"""
         logger.info("🔍 Comprehensive Check: Analyzing if follow-up needed")
-        updated_state = await self.comprehensive_query.analyze_and_expand(state)
-        logger.info(f"🔍 Comprehensive Check Result: needs_followup={updated_state.get('needs_comprehensive_followup', False)}, extracted_ids={updated_state.get('extracted_ids', {})}")
-        return updated_state
+        # Working copy - the agent flags follow-ups by assigning into the dict it gets
+        updated_state = await self.comprehensive_query.analyze_and_expand(dict(state))
+        logger.info("🔍 Comprehensive Check Result: needs_followup=%s, extracted_ids=%s",
+                    updated_state.get("needs_comprehensive_followup", False), updated_state.get("extracted_ids", {}))
+        return _state_delta(state, updated_state)
+    
+    def _route_after_comprehensive_check(self, state: ChatState) -> str:
+        """Branch to the follow-up node only when the check asked for one"""
+        return "followup" if state.get("needs_comprehensive_followup") else "enrich"
     
     async def _comprehensive_followup_node(self, state: ChatState) -> ChatState:
         """Execute comprehensive follow-up tools if needed"""
@@ -137,30 +209,30 @@ class EnhancedLangGraphWorkflow:
         # Check if follow-up is actually needed
         needs_followup = state.get("needs_comprehensive_followup", False)
         extracted_ids = state.get("extracted_ids", {})
-        logger.info(f"🔍 Followup Node Check: needs_followup={needs_followup}, extracted_ids={extracted_ids}")
-        logger.info(f"🔍 Full state keys: {list(state.keys())}")
+        logger.info("🔍 Followup Node Check: needs_followup=%s, extracted_ids=%s", needs_followup, extracted_ids)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("🔍 Full state keys: %s", list(state))
         
         if not needs_followup:
             logger.info("⏭️  Comprehensive follow-up not needed, skipping")
-            return state
+            return {}
         
         logger.info("🔄 Comprehensive Follow-up: Creating and executing follow-up plan")
         
-        # Create follow-up plan
-        state = await self.comprehensive_query.create_followup_plan(state)
+        # Create follow-up plan (on a working copy - the planner assigns into the dict it gets)
+        working = await self.comprehensive_query.create_followup_plan(dict(state))
         
         # Execute the follow-up tools
-        followup_plan = state.get("followup_tool_plan", [])
+        followup_plan = working.get("followup_tool_plan", [])
         if followup_plan:
             # Temporarily replace tool_plan with followup_plan
-            original_plan = state.get("tool_plan", [])
-            state["tool_plan"] = followup_plan
+            original_plan = working.get("tool_plan", [])
+            working["tool_plan"] = followup_plan
             
             # Send notification about follow-up tools
-            if hasattr(self, '_current_websocket') and self._current_websocket:
-                import json
+            if self._current_websocket:
                 tool_names = [tool.get("name", "Unknown") for tool in followup_plan]
-                await self._current_websocket.send_text(json.dumps({
+                await self._current_websocket.send_text(fast_json.dumps({
                     "on_tool_call": {
                         "tools": tool_names,
                         "count": len(tool_names),
@@ -169,19 +241,21 @@ class EnhancedLangGraphWorkflow:
                 }))
             
             # Execute the follow-up tools
-            logger.info(f"🔄 Executing {len(followup_plan)} comprehensive follow-up tools")
-            state = await self.tool_executor.execute_tools(state)
+            logger.info("🔄 Executing %d comprehensive follow-up tools", len(followup_plan))
+            working = await self.tool_executor.execute_tools(working)
+            self._check_schema_drift(working)
             
             # Restore original plan (now with additional results)
-            state["tool_plan"] = original_plan + followup_plan
+            working["tool_plan"] = original_plan + followup_plan
             
             # Clear follow-up flags
-            state["needs_comprehensive_followup"] = False
-            state.pop("followup_tool_plan", None)
+            working["needs_comprehensive_followup"] = False
+            working["followup_tool_plan"] = []
+            working["followup_parallelism"] = None
             
             logger.info("✅ Comprehensive follow-up execution completed")
         
-        return state
+        return _state_delta(state, working)
     
     async def _response_enrichment_node(self, state: ChatState) -> ChatState:
         """Response enrichment"""
@@ -190,51 +264,135 @@ class EnhancedLangGraphWorkflow:
         # Inject websocket reference and mcp_client if available (as non-serializable context)
         state_with_context = {**state}
         
-        if hasattr(self, '_current_websocket') and self._current_websocket:
+        if self._current_websocket:
             state_with_context["_websocket_ref"] = self._current_websocket
         
         # Add mcp_client for similar entity search when no results found
-        if hasattr(self, 'mcp_client') and self.mcp_client:
-            client = await self.mcp_client.get_client()
-            state_with_context["_mcp_client"] = client
+        if self.mcp_client:
+            state_with_context["_mcp_client"] = await self._get_client()
         
         result = await self.response_enricher.enrich_response(state_with_context)
         
-        # Remove non-serializable refs before returning
-        if "_websocket_ref" in result:
-            del result["_websocket_ref"]
-        if "_mcp_client" in result:
-            del result["_mcp_client"]
-        
-        return result
+        # The non-serializable refs are unchanged, so they never make it into the delta
+        return _state_delta(state_with_context, result)
     
     async def _orchestrator_finish_node(self, state: ChatState) -> ChatState:
         """Orchestrator finalization"""
         logger.info("🎯 Orchestrator: Finalizing workflow")
         
         # Update conversation history with current interaction
-        conversation_history = state.get("conversation_history", []).copy()
-        conversation_history.append({
-            "role": "user",
-            "content": state.get("user_query", "")
-        })
-        conversation_history.append({
-            "role": "assistant", 
-            "content": state.get("final_response", "")
-        })
-        
-        # Keep only last 10 messages (5 exchanges) to avoid context overflow
-        if len(conversation_history) > 10:
-            conversation_history = conversation_history[-10:]
-        
-        final_state = {
-            **state,
+        conversation_history = _append_exchange(
+            state.get("conversation_history") or _NO_ITEMS,
+            state.get("user_query", ""),
+            state.get("final_response", "")
+        )
+        
+        # The response is built, so only result summaries go into the checkpoint -
+        # raw tool payloads would otherwise be stored for as long as the thread lives
+        return {
             "conversation_history": conversation_history,
+            "mcp_results": summarize_mcp_results(state.get("mcp_results") or _NO_ITEMS),
             "workflow_status": "completed",
-            "completion_timestamp": datetime.now().isoformat()
+            "completion_timestamp": time.time()  # Epoch seconds; formatted in _format_response
         }
+    
+    async def _get_client(self):
+        """Default MCP client shared by the workflow nodes (its HTTP session stays open between queries)"""
+        if self._client is None:
+            self._client = await self.mcp_client.get_client()
+        return self._client
+    
+    def _peek_tools(self) -> Optional[Tuple[List[str], List[Dict[str, Any]]]]:
+        """Cached (tool names, schemas) if still fresh, without fetching"""
+        cached = self._tools_cache
+        if cached is not None and time.monotonic() - cached[0] < self._tools_ttl:
+            return cached[1], cached[2]
+        return None
+    
+    async def _get_tools(self) -> Tuple[List[str], List[Dict[str, Any]]]:
+        """Tool names and full schemas, refetched from the MCP server at most once per TTL"""
+        tools = self._peek_tools()
+        if tools is not None:
+            return tools
+        
+        async with self._tools_lock:
+            # Another query may have refilled the cache while we waited
+            tools = self._peek_tools()
+            if tools is not None:
+                return tools
+            
+            client = await self._get_client()
+            tools_response = await client.list_available_tools()
+            tool_schemas = tools_response.get("tools", [])  # Store full schemas
+            available_tools = [tool.get("name") for tool in tool_schemas]
+            logger.info("📋 Loaded %d available MCP tools", len(available_tools))
+            
+            self._tools_cache = (time.monotonic(), available_tools, tool_schemas)
+            return available_tools, tool_schemas
+    
+    async def prefetch_tools(self):
+        """Warm the tool cache ahead of a query that may need it; failures are left for the query to report"""
+        if self._peek_tools() is not None:
+            return
+        try:
+            await self._get_tools()
+        except Exception as e:
+            logger.debug("Tool prefetch failed: %s", e)
+    
+    def _check_schema_drift(self, state: ChatState):
+        """Drop the cached tool list if a tool failed in a way that suggests it no longer exists"""
+        if self._tools_cache is None:
+            return
+        for result in state.get("mcp_results") or _NO_ITEMS:
+            tool_result = result.get("result")
+            error = tool_result.get("error", "") if isinstance(tool_result, dict) else ""
+            if not result.get("success") and _SCHEMA_DRIFT_RE.search(str(error)):
+                logger.warning("⚠️ Tool %s looks missing on the MCP server, refreshing tool list", result.get("tool_name"))
+                self._tools_cache = None
+                if self._client is not None:
+                    self._client.invalidate_tools_cache()
+                return
+    
+    async def _load_conversation_history(self, thread_config: Dict[str, Any]) -> List[Dict[str, str]]:
+        """conversation_history from the thread's latest checkpoint ([] for a new conversation)"""
+        try:
+            checkpoint_tuple = await self.memory.aget_tuple(thread_config)
+            if checkpoint_tuple is None:
+                return []
+            return checkpoint_tuple.checkpoint["channel_values"].get("conversation_history") or []
+        except (AttributeError, KeyError, TypeError) as e:
+            # Unexpected checkpoint shape - fall back to the full state snapshot
+            logger.debug("Checkpoint fast path unavailable (%s), using aget_state", e)
+        except Exception as e:
+            logger.debug("No existing state found (new conversation): %s", e)
+            return []
         
-        return final_state
+        try:
+            existing_state = await self.app.aget_state(thread_config)
+            return (existing_state.values or {}).get("conversation_history") or []
+        except Exception as e:
+            logger.debug("No existing state found (new conversation): %s", e)
+            return []
+    
+    async def has_history(self, session_id: str) -> bool:
+        """True if the thread already has conversation history"""
+        return bool(await self._load_conversation_history({"configurable": {"thread_id": session_id}}))
+    
+    async def record_exchange(self, session_id: str, user_query: str, response: str):
+        """Append a turn answered outside the graph (e.g. from a cache) to the thread's history"""
+        thread_config = {"configurable": {"thread_id": session_id}}
+        history = await self._load_conversation_history(thread_config)
+        await self.app.aupdate_state(
+            thread_config,
+            {"conversation_history": _append_exchange(history, user_query, response)},
+            as_node="orchestrator_finish"
+        )
+    
+    async def aclose(self):
+        """Release the MCP clients and their pooled HTTP connections"""
+        self._client = None
+        self.tool_executor.clear_client_cache()
+        await self.mcp_client.aclose()
     
     # Main Processing Method
     
@@ -251,37 +409,30 @@ class EnhancedLangGraphWorkflow:
             Dict containing response, analysis, and execution details
         """
         try:
-            logger.info(f"🚀 Processing: '{user_query}'")
+            logger.info("🚀 Processing: '%s'", user_query)
             
             # Store websocket separately (not in state - can't be serialized)
             self._current_websocket = websocket
             
             # Determine the thread_id for this conversation
-            thread_id = session_id or str(uuid.uuid4())
+            thread_id = session_id or uuid4().hex
             thread_config = {"configurable": {"thread_id": thread_id}}
             
-            # Try to get existing state from checkpointer to preserve conversation_history
-            existing_state = None
-            try:
-                existing_state = await self.app.aget_state(thread_config)
-                if existing_state and existing_state.values:
-                    logger.info(f"📚 Found existing conversation state for thread: {thread_id}")
-                    # Check if there's conversation history
-                    conv_history = existing_state.values.get("conversation_history", [])
-                    if conv_history:
-                        logger.info(f"💬 Loaded {len(conv_history)} previous messages from conversation history")
-            except Exception as e:
-                logger.debug(f"No existing state found (new conversation): {e}")
+            # Try to get existing conversation_history from the checkpointer.
+            # aget_tuple reads the latest checkpoint's channel values directly; aget_state would
+            # also rebuild the full StateSnapshot (pending tasks, next nodes) that we don't need.
+            existing_history = await self._load_conversation_history(thread_config)
+            if existing_history:
+                logger.info("📚 Found existing conversation state for thread: %s", thread_id)
+                logger.info("💬 Loaded %d previous messages from conversation history", len(existing_history))
             
             # Create initial state
             initial_state = create_initial_state(user_query, thread_id)
             
             # If we have existing conversation history, preserve it
-            if existing_state and existing_state.values:
-                existing_history = existing_state.values.get("conversation_history", [])
-                if existing_history:
-                    initial_state["conversation_history"] = existing_history
-                    logger.info(f"✅ Preserved {len(existing_history)} messages from previous conversation")
+            if existing_history:
+                initial_state["conversation_history"] = existing_history
+                logger.info("✅ Preserved %d messages from previous conversation", len(existing_history))
             
             # Run the workflow
             result = await self.app.ainvoke(
@@ -292,11 +443,11 @@ class EnhancedLangGraphWorkflow:
             # Format response
             response = self._format_response(result)
             
-            logger.info(f"✅ Processing completed successfully")
+            logger.info("✅ Processing completed successfully")
             return response
             
         except Exception as e:
-            logger.error(f"❌ Query processing failed: {str(e)}")
+            logger.error("❌ Query processing failed: %s", e)
             return {
                 "success": False,
                 "error": str(e),
@@ -307,6 +458,7 @@ class EnhancedLangGraphWorkflow:
     def _format_response(self, final_state: ChatState) -> Dict[str, Any]:
         """Format the final response"""
         
+        completed_at = final_state.get("completion_timestamp")
         return {
             "success": final_state.get("workflow_status") == "completed",
             "response": final_state.get("final_response", "Analysis completed"),
@@ -316,22 +468,22 @@ class EnhancedLangGraphWorkflow:
                 "confidence_score": final_state.get("confidence_score", 0)
             },
             "execution_summary": {
-                "tools_executed": len(final_state.get("executed_tools", [])),
+                "tools_executed": len(final_state.get("executed_tools") or _NO_ITEMS),
                 "success_rate": self._calculate_success_rate(final_state)
             },
             "enrichment": final_state.get("enrichment_data", {}),
             "session_info": {
                 "session_id": final_state.get("session_id"),
                 "request_id": final_state.get("request_id"),
-                "timestamp": final_state.get("completion_timestamp")
+                "timestamp": datetime.fromtimestamp(completed_at).isoformat() if completed_at is not None else None
             }
         }
     
     def _calculate_success_rate(self, state: ChatState) -> float:
         """Calculate success rate for tool execution"""
-        mcp_results = state.get("mcp_results", [])
+        mcp_results = state.get("mcp_results") or _NO_ITEMS
         if not mcp_results:
             return 0.0
         
-        successful = sum(1 for result in mcp_results if result.get("success"))
+        successful = [bool(result.get("success")) for result in mcp_results].count(True)
         return successful / len(mcp_results)